@@ -0,0 +1,167 @@
+"""End-to-end latency of message generation against the local fake Groq server.
+
+Reports, over several runs:
+
+- time to first token and total time of ``stream_morning_message``
+- total time of ``generate_morning_message``
+- time from creating ``ModernWindow`` until the first character of the message
+  is on screen, and until the whole message is
+
+Build the Cython modules first, then run from anywhere:
+
+    python benchmarks/bench_latency.py --runs 20 --ttft-ms 300
+
+Use ``QT_QPA_PLATFORM=offscreen`` and ``SDL_AUDIODRIVER=dummy`` on a machine
+without a display or sound card.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from fake_groq import FakeGroqServer, FakeGroqSettings
+import archive_cy
+from generation_cy import stream_morning_message, generate_morning_message
+
+def summarize(name, samples):
+    if not samples:
+        print(f"{name:<28} no samples")
+        return
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    print(f"{name:<28} p50 {statistics.median(ordered) * 1000:8.1f} ms   "
+          f"p95 {p95 * 1000:8.1f} ms   max {ordered[-1] * 1000:8.1f} ms   n={len(ordered)}")
+
+def bench_generation(config, runs):
+    ttft, total, whole, errors = [], [], [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        first = None
+        try:
+            for _content in stream_morning_message(config, use_cache=False):
+                if first is None:
+                    first = time.perf_counter() - started
+        except ValueError:
+            errors += 1
+            continue
+        total.append(time.perf_counter() - started)
+        if first is not None:
+            ttft.append(first)
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        try:
+            generate_morning_message(config)
+        except ValueError:
+            errors += 1
+            continue
+        whole.append(time.perf_counter() - started)
+
+    summarize("stream: first token", ttft)
+    summarize("stream: total", total)
+    summarize("generate_morning_message", whole)
+    if errors:
+        print(f"{'failed requests':<28} {errors}")
+
+def bench_window(config, runs, timeout):
+    from PyQt5.QtCore import QEventLoop, QTimer
+    from PyQt5.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # The window reads its settings from disk; hand it the benchmark profile instead.
+    main.load_config = lambda: dict(config)
+    main.load_prefetched = lambda config, now=None: None
+
+    first_char, full_text = [], []
+    for _ in range(runs):
+        marks = {}
+        started = time.perf_counter()
+        window = main.ModernWindow()
+        window.show()
+
+        loop = QEventLoop()
+        poll = QTimer()
+
+        def check():
+            # Until the message starts, the label shows "..." and window.text is empty.
+            revealed = window.label.revealed if window.text else 0
+            if "first" not in marks and revealed > 0:
+                marks["first"] = time.perf_counter() - started
+            if window.text and revealed == len(window.text) and not window.generation.running:
+                marks["full"] = time.perf_counter() - started
+                loop.quit()
+
+        poll.timeout.connect(check)
+        poll.start(1)
+        QTimer.singleShot(int(timeout * 1000), loop.quit)
+        loop.exec_()
+        poll.stop()
+
+        window.close()
+        window.generation.shutdown()
+        window.deleteLater()
+        app.processEvents()
+
+        if "first" in marks:
+            first_char.append(marks["first"])
+        if "full" in marks:
+            full_text.append(marks["full"])
+
+    summarize("window: first character", first_char)
+    summarize("window: whole message", full_text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure generation latency against the fake Groq server.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="server delay before the first chunk")
+    parser.add_argument("--inter-token-ms", type=float, default=20.0, help="server delay between chunks")
+    parser.add_argument("--tokens", type=int, default=60, help="chunks per completion")
+    parser.add_argument("--token-size", type=int, default=0, help="pad every chunk to this many characters")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--timeout", type=float, default=30.0, help="give up on a window after this many seconds")
+    parser.add_argument("--no-window", action="store_true", help="skip the ModernWindow measurements")
+    args = parser.parse_args()
+
+    server = FakeGroqServer(settings=FakeGroqSettings(
+        args.ttft_ms, args.inter_token_ms, args.tokens, args.token_size,
+        args.error_rate, args.error_status))
+    config = {
+        "token": "benchmark",
+        "name": "Benchmark",
+        "language": "English",
+        "model": "gemma2-9b-it",
+        "base_url": server.start(),
+        # Every run must reach the API; the cache and the local fallback would hide its latency.
+        "cache_ttl": 0,
+        "first_token_deadline_ms": 0,
+        # Keep benchmark runs out of the real generation_metrics.json.
+        "metrics": False,
+        # The fake server has no quota to protect.
+        "rate_limit_rpm": 0,
+        # It sends the same text every time; the duplicate check would generate each message twice.
+        "history_size": 0,
+    }
+    # Keep benchmark messages out of the real message_archive.db.
+    archive_dir = tempfile.mkdtemp()
+    archive_cy.archive_path = lambda: os.path.join(archive_dir, archive_cy.ARCHIVE_FILE)
+
+    print(f"Fake Groq API at {config['base_url']}: first chunk after {args.ttft_ms:.0f} ms, "
+          f"{args.tokens} chunks {args.inter_token_ms:.0f} ms apart")
+    try:
+        bench_generation(config, args.runs)
+        if not args.no_window:
+            bench_window(config, args.runs, args.timeout)
+    finally:
+        server.stop()
+        archive_cy.get_archive().close()
+        # Generation threads may still hold the database open.
+        shutil.rmtree(archive_dir, ignore_errors=True)
@@ -0,0 +1,99 @@
+"""Compare the groq SDK with the native transport (``"transport": "native"``).
+
+Reports the import time of each client, and the CPU time and peak traced
+memory of streaming completions from the fake Groq server, which runs in its
+own process so its work is not counted.
+
+Build the Cython modules first, then:
+
+    python benchmarks/bench_transport.py --runs 20 --tokens 500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+IMPORTS = {
+    "sdk": "import httpx; from groq import Groq, DefaultHttpxClient",
+    "native": "from transport_cy import NativeClient",
+}
+
+def import_time(statement, runs):
+    code = f"import time; started = time.perf_counter(); {statement}; print(time.perf_counter() - started)"
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout))
+    return statistics.median(samples)
+
+def start_server(args):
+    server = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_groq.py"), "--port", "0",
+        "--ttft-ms", "0", "--inter-token-ms", "0",
+        "--tokens", str(args.tokens), "--token-size", str(args.token_size),
+    ], stdout=subprocess.PIPE, text=True)
+    base_url = server.stdout.readline().strip().rsplit(" ", 1)[1]
+    return server, base_url
+
+def stream_sdk(client, messages):
+    chunks = 0
+    for chunk in client.chat.completions.create(model="gemma2-9b-it", messages=messages, stream=True):
+        if chunk.choices and chunk.choices[0].delta.content:
+            chunks += 1
+    return chunks
+
+def stream_native(client, messages):
+    chunks = 0
+    for _content in client.stream_chat("gemma2-9b-it", messages):
+        chunks += 1
+    return chunks
+
+def bench_stream(name, client, stream, runs):
+    messages = [{"role": "user", "content": "Good morning"}]
+    stream(client, messages)  # connect and warm up
+
+    cpu, wall, chunks = [], [], 0
+    for _ in range(runs):
+        started_cpu, started_wall = time.process_time(), time.perf_counter()
+        chunks = stream(client, messages)
+        cpu.append(time.process_time() - started_cpu)
+        wall.append(time.perf_counter() - started_wall)
+
+    tracemalloc.start()
+    stream(client, messages)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cpu_per_chunk = statistics.median(cpu) / max(chunks, 1) * 1e6
+    print(f"{name:<8} {cpu_per_chunk:9.1f} us CPU/chunk   {statistics.median(wall) * 1000:8.1f} ms/stream   "
+          f"{peak / 1024:8.1f} KiB peak   ({chunks} chunks)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the groq SDK against the native transport.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=300, help="chunks per completion")
+    parser.add_argument("--token-size", type=int, default=0, help="pad every chunk to this many characters")
+    args = parser.parse_args()
+
+    print("Import time (median of fresh interpreters)")
+    for name, statement in IMPORTS.items():
+        print(f"{name:<8} {import_time(statement, args.runs) * 1000:9.1f} ms")
+
+    from clients_cy import get_client, close_clients
+
+    server, base_url = start_server(args)
+    try:
+        print(f"\nStreaming {args.tokens} chunks from {base_url}")
+        bench_stream("sdk", get_client("benchmark", base_url, "sdk"), stream_sdk, args.runs)
+        bench_stream("native", get_client("benchmark", base_url, "native"), stream_native, args.runs)
+    finally:
+        close_clients()
+        server.terminate()
+        server.wait()
@@ -0,0 +1,199 @@
+"""Local stand-in for the Groq OpenAI-compatible chat completions endpoint.
+
+Point a profile at it with ``"base_url": "http://127.0.0.1:8765"`` and every
+generation path talks to this server instead of the real API.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("Good", "morning", "sunshine", "drink", "some", "water", "brush", "your", "teeth",
+         "and", "take", "it", "one", "step", "at", "a", "time", "today", "you", "matter")
+
+class FakeGroqSettings:
+    def __init__(self, ttft_ms=200.0, inter_token_ms=20.0, tokens=60, token_size=0,
+                 error_rate=0.0, error_status=500, retry_after=None, model_ttft_ms=None, seed=None):
+        self.ttft_ms = ttft_ms
+        self.model_ttft_ms = dict(model_ttft_ms or {})
+        self.inter_token_ms = inter_token_ms
+        self.tokens = tokens
+        self.token_size = token_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def next_token(self, index):
+        word = WORDS[index % len(WORDS)]
+        if self.token_size > len(word) + 1:
+            word = word.ljust(self.token_size - 1, word[-1])
+        return word + " "
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            return self.random.random() < self.error_rate
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeGroq/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        body = json.dumps({"object": "list", "data": []}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        settings = self.server.settings
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.endswith("/chat/completions"):
+            return self.send_error_json(404, "Unknown endpoint")
+        if self.headers.get("Authorization") == "Bearer invalid":
+            return self.send_error_json(401, "Invalid API Key")
+        if settings.should_fail():
+            return self.send_error_json(settings.error_status, "Injected failure")
+
+        model = request.get("model", "fake-model")
+        completion_id = "chatcmpl-" + uuid.uuid4().hex
+        time.sleep(settings.model_ttft_ms.get(model, settings.ttft_ms) / 1000.0)
+
+        if not request.get("stream"):
+            text = "".join(settings.next_token(i) for i in range(settings.tokens)).strip()
+            body = json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 40, "completion_tokens": settings.tokens, "total_tokens": 40 + settings.tokens},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_rate_limit_headers()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_rate_limit_headers()
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            for index in range(settings.tokens):
+                if index:
+                    time.sleep(settings.inter_token_ms / 1000.0)
+                self.send_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": settings.next_token(index)}, "finish_reason": None}],
+                })
+            self.send_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "x_groq": {"id": completion_id, "usage": {"prompt_tokens": 40, "completion_tokens": settings.tokens,
+                                                          "total_tokens": 40 + settings.tokens}},
+            })
+            self.send_chunk(b"data: [DONE]\n\n")
+            self.send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def send_rate_limit_headers(self):
+        self.send_header("x-ratelimit-limit-requests", "14400")
+        self.send_header("x-ratelimit-remaining-requests", "14399")
+        self.send_header("x-ratelimit-reset-requests", "6s")
+        self.send_header("x-ratelimit-limit-tokens", "6000")
+        self.send_header("x-ratelimit-remaining-tokens", "5900")
+        self.send_header("x-ratelimit-reset-tokens", "1s")
+
+    def send_event(self, payload):
+        self.send_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_error_json(self, status, message):
+        body = json.dumps({"error": {"message": message, "type": "fake_error"}}).encode("utf-8")
+        self.send_response(status)
+        if status == 429 and self.server.settings.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.settings.retry_after))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address=("127.0.0.1", 0), settings=None):
+        super().__init__(address, FakeGroqHandler)
+        self.settings = settings or FakeGroqSettings()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread and return the base URL to configure."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Groq chat completions API for local testing and benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="delay before the first chunk")
+    parser.add_argument("--inter-token-ms", type=float, default=20.0, help="delay between chunks")
+    parser.add_argument("--tokens", type=int, default=60, help="chunks per completion")
+    parser.add_argument("--token-size", type=int, default=0, help="pad every chunk to this many characters")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--model-ttft", action="append", default=[], metavar="MODEL=MS",
+                        help="override the first-chunk delay for one model (repeatable)")
+    args = parser.parse_args()
+    model_ttft_ms = {model: float(ms) for model, ms in (item.split("=", 1) for item in args.model_ttft)}
+
+    server = FakeGroqServer(("127.0.0.1", args.port), FakeGroqSettings(
+        args.ttft_ms, args.inter_token_ms, args.tokens, args.token_size,
+        args.error_rate, args.error_status, args.retry_after, model_ttft_ms))
+    print(f"Fake Groq API listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
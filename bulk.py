@@ -0,0 +1,22 @@
+import argparse
+import sys
+from config_cy import CONFIG_FILE, load_config
+from bulk_cy import run_bulk, DEFAULT_BULK_CONCURRENCY
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate morning messages for many profiles from a CSV or JSON Lines file.")
+    parser.add_argument("profiles", help="CSV with a header row, or .jsonl, with name and optionally language, model, prompt, id")
+    parser.add_argument("output", help="where to write the messages (.csv or .jsonl); <output>.journal keeps progress")
+    parser.add_argument("--config", default=CONFIG_FILE, help="profile with the API token to use (default: config.json)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_BULK_CONCURRENCY, help="requests in flight at once")
+    args = parser.parse_args()
+
+    try:
+        summary = run_bulk(load_config(args.config), args.profiles, args.output, args.concurrency)
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print(f"Interrupted; run the same command again to resume from {args.output}.journal", file=sys.stderr)
+        sys.exit(130)
+    sys.exit(1 if summary["failed"] else 0)
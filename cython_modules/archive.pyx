@@ -0,0 +1,210 @@
+# cython: language_level=3
+import cython
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from config_cy import ARCHIVE_FILE, data_path
+
+PAGE_SIZE = 50
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    language TEXT,
+    model TEXT,
+    prompt TEXT,
+    message TEXT NOT NULL,
+    simhash INTEGER,
+    ttft_ms REAL,
+    total_ms REAL,
+    tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_created ON messages (created);
+CREATE INDEX IF NOT EXISTS messages_profile ON messages (profile, id);
+CREATE INDEX IF NOT EXISTS messages_language ON messages (language, id);
+CREATE INDEX IF NOT EXISTS messages_model ON messages (model, id);
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    message TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_used ON cache (used);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    token_capacity REAL,
+    updated REAL NOT NULL,
+    paused_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_limit_waiters (
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    since REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    PRIMARY KEY (key, owner)
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (message, content='messages', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+END;
+"""
+
+COLUMNS = ("id", "created", "profile", "language", "model", "prompt", "message", "ttft_ms", "total_ms", "tokens")
+
+_SEARCH_WORD = re.compile(r"\w+")
+
+def archive_path() -> str:
+    return data_path(ARCHIVE_FILE)
+
+def _signed(unsigned long long value) -> int:
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _fts_query(str text) -> str:
+    """Each word of ``text`` as a quoted prefix term, so user input cannot break the FTS syntax."""
+    return " ".join(f'"{word}"*' for word in _SEARCH_WORD.findall(text))
+
+class Archive:
+    """Every generated message, with the message cache and the shared rate limits, in one SQLite database.
+
+    The database runs in WAL mode, so the window reads while generation writes.
+    Each thread gets its own connection.
+    """
+
+    def __init__(self, str path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.ready = False
+        self.fts = False
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self.lock:
+                if not self.ready:
+                    connection.executescript(SCHEMA)
+                    try:
+                        connection.executescript(FTS_SCHEMA)
+                        self.fts = True
+                    except sqlite3.OperationalError:
+                        # SQLite built without FTS5; search falls back to LIKE.
+                        self.fts = False
+                    self.ready = True
+            self.local.connection = connection
+        return connection
+
+    def add(self, str profile, str message, language: Optional[str] = None, model: Optional[str] = None,
+            prompt: Optional[str] = None, fingerprint: Optional[int] = None, trace=None, now=None) -> int:
+        """Store one message and return its id. ``trace`` adds the timings of a GenerationTrace."""
+        if now is None:
+            now = datetime.now()
+        ttft = trace.ttft if trace is not None else None
+        duration = trace.duration if trace is not None else None
+        cursor = self.connection().execute(
+            "INSERT INTO messages (created, profile, language, model, prompt, message, simhash, ttft_ms, total_ms, tokens) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (now.isoformat(timespec="seconds"), profile, language, model, prompt, message,
+             _signed(fingerprint) if fingerprint is not None else None,
+             ttft * 1000 if ttft is not None else None, duration * 1000 if duration is not None else None,
+             trace.tokens if trace is not None else None))
+        return cursor.lastrowid
+
+    def fingerprints(self, str profile, int limit) -> List[int]:
+        """The SimHash fingerprints of ``profile``'s last ``limit`` messages, oldest first."""
+        rows = self.connection().execute(
+            "SELECT simhash FROM messages WHERE profile = ? AND simhash IS NOT NULL ORDER BY id DESC LIMIT ?",
+            (profile, limit)).fetchall()
+        return [row[0] & 0xFFFFFFFFFFFFFFFF for row in reversed(rows)]
+
+    def _filters(self, query: Optional[str], profile: Optional[str]) -> tuple:
+        """The FROM and WHERE parts, and their parameters, selecting messages that match, and the id to order by."""
+        source, order, clauses, params = "messages", "messages.id", [], []
+        if query:
+            terms = _fts_query(query) if self.fts else None
+            if terms:
+                # Ordered by the FTS rowid, SQLite walks the matches newest first and stops after a page.
+                source = "messages_fts JOIN messages ON messages.id = messages_fts.rowid"
+                order = "messages_fts.rowid"
+                clauses.append("messages_fts MATCH ?")
+                params.append(terms)
+            elif self.fts:
+                # Only punctuation: no word can match, and leaving the clause out would match everything.
+                clauses.append("0")
+            else:
+                clauses.append("message LIKE ?")
+                params.append(f"%{query}%")
+        if profile:
+            clauses.append("profile = ?")
+            params.append(profile)
+        return source, order, clauses, params
+
+    def page(self, before: Optional[int] = None, int limit=PAGE_SIZE, query: Optional[str] = None,
+             profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Up to ``limit`` messages older than id ``before``, newest first.
+
+        Paging by id keeps every page as cheap as the first, however deep the
+        archive is scrolled. ``query`` searches the message text.
+        """
+        connection = self.connection()
+        source, order, clauses, params = self._filters(query, profile)
+        if before is not None:
+            clauses.append(f"{order} < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        columns = ", ".join(f"messages.{column}" for column in COLUMNS)
+        rows = connection.execute(f"SELECT {columns} FROM {source} {where}ORDER BY {order} DESC LIMIT ?",
+                                  params + [limit]).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, query: Optional[str] = None, profile: Optional[str] = None) -> int:
+        source, _order, clauses, params = self._filters(query, profile)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self.connection().execute(f"SELECT COUNT(*) FROM {source}{where}", params).fetchone()[0]
+
+    def summary(self, int days=30, now=None) -> List[Dict[str, Any]]:
+        """Messages per model and language over the last ``days`` days, with their average length and timings."""
+        if now is None:
+            now = datetime.now()
+        since = (now - timedelta(days=days)).isoformat(timespec="seconds")
+        rows = self.connection().execute(
+            "SELECT model, language, COUNT(*), AVG(LENGTH(message)), AVG(ttft_ms), AVG(total_ms) "
+            "FROM messages WHERE created >= ? GROUP BY model, language ORDER BY COUNT(*) DESC", (since,)).fetchall()
+        return [dict(zip(("model", "language", "messages", "average_length", "average_ttft_ms", "average_total_ms"), row))
+                for row in rows]
+
+    def close(self) -> None:
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+def get_archive() -> Archive:
+    """Return the archive next to the loaded profile."""
+    cdef str path = archive_path()
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None:
+            archive = _archives[path] = Archive(path)
+        return archive
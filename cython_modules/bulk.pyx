@@ -0,0 +1,188 @@
+# cython: language_level=3
+import cython
+import os
+import csv
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config_cy import DEFAULT_PROMPTS
+from generation_cy import SYSTEM_PROMPTS, render_prompt, generate_many
+
+DEFAULT_BULK_CONCURRENCY = 16
+REPORT_INTERVAL = 5.0
+OUTPUT_FIELDS = ("id", "name", "language", "model", "prompt", "message", "error")
+
+def _is_jsonl(str path) -> bool:
+    return os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json")
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def read_profiles(str path) -> List[Dict[str, Any]]:
+    """Read profiles from a CSV file with a header row, or from JSON Lines.
+
+    Each profile has a ``name`` and optionally ``language``, ``model``, ``prompt``
+    and ``id``. Without an ``id`` the row number is used, so keep the file in the
+    same order when resuming.
+    """
+    cdef int number = 0
+    profiles = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        rows = (json.loads(line) for line in file if line.strip()) if _is_jsonl(path) else csv.DictReader(file)
+        for row in rows:
+            number += 1
+            profile = {key: value for key, value in row.items() if key and value not in (None, "")}
+            profile["id"] = str(profile.get("id", number))
+            profiles.append(profile)
+    return profiles
+
+def profile_config(dict config, dict profile) -> Dict[str, Any]:
+    """The base ``config`` with one profile's name, language, model and prompt filled in.
+
+    The base prompt is only kept for profiles in the base language; others get
+    that language's default prompt.
+    """
+    job = dict(config)
+    for key in ("name", "language", "model"):
+        if key in profile:
+            job[key] = profile[key]
+    language = job.get("language", "English")
+    if "prompt" in profile:
+        job["prompt"] = profile["prompt"]
+    elif language != config.get("language", "English") and language in DEFAULT_PROMPTS:
+        job["prompt"] = DEFAULT_PROMPTS[language]
+    return job
+
+def journal_path(str output) -> str:
+    return output + ".journal"
+
+def load_journal(str path) -> tuple:
+    """Completed results by profile id, and the length of the journal up to its last complete line.
+
+    A line cut short by an interrupted run is skipped; it must be cut off
+    before appending, or the next result would be glued onto it and lost.
+    """
+    done = {}
+    cdef long long end = 0
+    try:
+        with open(path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                try:
+                    entry = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                done[entry["id"]] = entry
+    except OSError:
+        pass
+    return done, end
+
+def write_output(str path, list rows) -> None:
+    cdef str tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        if _is_jsonl(path):
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            writer = csv.DictWriter(file, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+class _Progress:
+    """Appends each finished message to the journal and reports the rate."""
+
+    def __init__(self, journal, list jobs, int total, int skipped):
+        self.journal = journal
+        self.jobs = jobs
+        self.total = total
+        self.skipped = skipped
+        self.generated = 0
+        self.failed = {}
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    def rate(self) -> float:
+        cdef double elapsed = time.monotonic() - self.started
+        return self.generated / elapsed * 60 if elapsed > 0 else 0.0
+
+    def __call__(self, int index, dict result) -> None:
+        profile, job = self.jobs[index]
+        row = {
+            "id": profile["id"],
+            "name": job.get("name", "user"),
+            "language": job.get("language", "English"),
+            "model": job.get("model", "gemma2-9b-it"),
+            "prompt": result["prompt"],
+            "message": result["message"],
+            "error": result["error"],
+        }
+        if result["error"] is not None:
+            # Failures stay out of the journal so the next run tries them again.
+            self.failed[profile["id"]] = row
+        else:
+            self.generated += 1
+            self.journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.journal.flush()
+
+        cdef double now = time.monotonic()
+        if now - self.reported >= REPORT_INTERVAL:
+            self.reported = now
+            print(f"{self.skipped + self.generated}/{self.total} done, {len(self.failed)} failed, "
+                  f"{self.rate():.0f} messages/minute", flush=True)
+
+def run_bulk(dict config, str profiles_path, str output_path, int concurrency=DEFAULT_BULK_CONCURRENCY,
+             now=None) -> Dict[str, Any]:
+    """Generate a message for every profile, resuming from the journal of an earlier run.
+
+    Each message is appended to ``<output>.journal`` as soon as it arrives. The
+    output file (CSV, or JSON Lines for .jsonl) is written from the journal at
+    the end, in profile order, with failed profiles carrying their ``error``.
+    """
+    if now is None:
+        now = datetime.now()
+    profiles = read_profiles(profiles_path)
+    cdef str journal_file = journal_path(output_path)
+    done, end = load_journal(journal_file)
+
+    jobs = []
+    invalid = {}
+    for profile in profiles:
+        if profile["id"] in done:
+            continue
+        job = profile_config(config, profile)
+        if job.get("language", "English") not in SYSTEM_PROMPTS:
+            invalid[profile["id"]] = dict(id=profile["id"], name=job.get("name"), language=job.get("language"),
+                                          error=f"Unsupported language '{job.get('language')}'.")
+            continue
+        jobs.append((profile, job))
+
+    print(f"{len(profiles)} profiles: {len(done)} already done, {len(jobs)} to generate", flush=True)
+    with open(journal_file, "a", encoding="utf-8") as journal:
+        journal.truncate(end)
+        progress = _Progress(journal, jobs, len(profiles), len(done))
+        if jobs:
+            generate_many(config, [job for _profile, job in jobs], now, concurrency, progress)
+
+    done, _end = load_journal(journal_file)
+    failed = dict(invalid, **progress.failed)
+    for profile in profiles:
+        if profile["id"] not in done and profile["id"] not in failed:
+            failed[profile["id"]] = dict(id=profile["id"], name=profile.get("name"), language=profile.get("language"),
+                                         error="No message was generated.")
+    rows = [done.get(profile["id"]) or failed.get(profile["id"]) for profile in profiles]
+    write_output(output_path, [row for row in rows if row is not None])
+
+    summary = {
+        "profiles": len(profiles),
+        "generated": progress.generated,
+        "resumed": progress.skipped,
+        "failed": len(failed),
+        "messages_per_minute": progress.rate(),
+        "seconds": time.monotonic() - progress.started,
+    }
+    print(f"Generated {summary['generated']} messages ({summary['resumed']} resumed, {summary['failed']} failed) "
+          f"in {summary['seconds']:.1f} s, {summary['messages_per_minute']:.0f} messages/minute", flush=True)
+    return summary
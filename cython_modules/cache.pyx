@@ -0,0 +1,72 @@
+# cython: language_level=3
+import cython
+import json
+import time
+import hashlib
+import sqlite3
+from typing import Optional
+from archive_cy import get_archive
+
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_CACHE_MAX_ENTRIES = 64
+
+def cache_key(str prompt, str model, str language, str system_prompt) -> str:
+    cdef str payload = json.dumps([prompt, model, language, system_prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MessageCache:
+    """Generated messages in the archive's ``cache`` table, expired after ``ttl`` seconds
+    and evicted least recently used first."""
+
+    def __init__(self, archive, double ttl=DEFAULT_CACHE_TTL, int max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        self.archive = archive
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, str key) -> Optional[str]:
+        cdef double now = time.time()
+        try:
+            connection = self.archive.connection()
+            row = connection.execute("SELECT message, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now >= row[1]:
+                connection.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                return None
+            connection.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            # A locked or broken database only costs a call to the API.
+            return None
+        return row[0]
+
+    def put(self, str key, str message, expires: Optional[float] = None) -> None:
+        """Store ``message``; it expires after ``ttl`` seconds unless an ``expires`` timestamp is given."""
+        cdef double now = time.time()
+        try:
+            connection = self.archive.connection()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("INSERT OR REPLACE INTO cache (key, message, created, used, expires) VALUES (?, ?, ?, ?, ?)",
+                                   (key, message, now, now, now + self.ttl if expires is None else expires))
+                connection.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                connection.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                                   (self.max_entries,))
+        except sqlite3.Error:
+            pass
+
+_caches = {}
+
+def get_cache(dict config) -> Optional[MessageCache]:
+    """Return the shared cache configured by ``cache_ttl``/``cache_max_entries``, or None when disabled."""
+    cdef double ttl = config.get("cache_ttl", DEFAULT_CACHE_TTL)
+    cdef int max_entries = config.get("cache_max_entries", DEFAULT_CACHE_MAX_ENTRIES)
+    if ttl <= 0 or max_entries <= 0:
+        return None
+
+    archive = get_archive()
+    cache = _caches.get(archive.path)
+    if cache is None:
+        cache = _caches[archive.path] = MessageCache(archive, ttl, max_entries)
+    cache.ttl = ttl
+    cache.max_entries = max_entries
+    return cache
@@ -0,0 +1,93 @@
+# cython: language_level=3
+import cython
+import threading
+from typing import Any, Optional
+from transport_cy import NativeClient
+
+MAX_CONNECTIONS = 4
+KEEPALIVE_EXPIRY = 120.0
+DEFAULT_TRANSPORT = "sdk"
+
+_clients = {}
+_http_clients = {}
+_lock = threading.Lock()
+
+def _create_sdk_client(key, str token, base_url: Optional[str] = None) -> Any:
+    # The SDK and its dependencies take a good part of a second to import, so
+    # they are only loaded by profiles that use them.
+    import httpx
+    from groq import Groq, DefaultHttpxClient
+    http_client = _http_clients[key] = DefaultHttpxClient(limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    ))
+    return Groq(api_key=token, base_url=base_url, http_client=http_client, max_retries=0)
+
+def get_client(str token, base_url: Optional[str] = None, str transport=DEFAULT_TRANSPORT) -> Any:
+    """Return the process-wide client for this token and endpoint, creating it on first use.
+
+    Each client keeps its connections alive between requests, so only the first
+    generation pays for DNS, TCP and TLS setup. ``transport`` picks the groq SDK
+    (``"sdk"``) or the lightweight NativeClient (``"native"``).
+    """
+    key = (token, base_url, transport)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            if transport == "native":
+                client = NativeClient(token, base_url, MAX_CONNECTIONS, KEEPALIVE_EXPIRY)
+            elif transport == "sdk":
+                client = _create_sdk_client(key, token, base_url)
+            else:
+                raise ValueError(f"Unknown transport '{transport}'. Use \"sdk\" or \"native\".")
+            _clients[key] = client
+        return client
+
+def _open_connection(str token, base_url: Optional[str], str transport) -> None:
+    client = get_client(token, base_url, transport)
+    if transport == "native":
+        client.connect()
+    else:
+        # Any response leaves the connection in the pool; HEAD keeps it cheap.
+        _http_clients[(token, base_url, transport)].head(str(client.base_url))
+
+def _prewarm(str token, base_url: Optional[str], str transport) -> None:
+    try:
+        _open_connection(token, base_url, transport)
+    except Exception:
+        # Only a head start; the first request reports any real problem.
+        pass
+
+def prewarm(dict config) -> Optional[threading.Thread]:
+    """Resolve DNS and finish the TCP and TLS handshakes with the API on a background thread.
+
+    Called as soon as the config is read, so the connection is ready by the
+    time the window asks for its first message. Turned off by ``"prewarm": false``.
+    """
+    if not config.get("prewarm", True) or not config.get("token"):
+        return None
+    thread = threading.Thread(target=_prewarm, daemon=True, args=(
+        config.get("token"), config.get("base_url"), config.get("transport", DEFAULT_TRANSPORT)))
+    thread.start()
+    return thread
+
+def close_clients() -> None:
+    """Close every pooled connection. Call once when the application exits."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _http_clients.clear()
+    for client in clients:
+        client.close()
+
+def create_async_client(str token, base_url: Optional[str] = None, int max_connections=MAX_CONNECTIONS) -> Any:
+    """Create an async client for one batch. Async connections are bound to their event loop, so these are not pooled."""
+    import httpx
+    from groq import AsyncGroq, DefaultAsyncHttpxClient
+    http_client = DefaultAsyncHttpxClient(limits=httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    ))
+    return AsyncGroq(api_key=token, base_url=base_url, http_client=http_client, max_retries=0)
@@ -0,0 +1,53 @@
+# cython: language_level=3
+import cython
+import os
+import json
+from typing import Dict, Any
+
+# Settings and the files kept next to them. Nothing here imports Qt, pygame or
+# PIL, so the headless entry points can load a profile without them.
+CONFIG_FILE = "config.json"
+PREFETCH_FILE = "prefetched_message.json"
+METRICS_FILE = "generation_metrics.json"
+ARCHIVE_FILE = "message_archive.db"
+
+DEFAULT_PROMPTS = {
+    "English": """
+    Generate a single-line morning wish that encourages the person to: take care of themselves, their appearance, their well-being, complete tasks, brush their teeth, and go to bed on time.
+    Name: {name}
+    Date: {day}
+    Time: {time}
+    """,
+    "Russian": """
+    Сгенерируй в одну строку пожелания на доброе утро, так же человек должен: заботиться о себе, о внешности, о состоянии, выполнять задачи, чистить зубы и засыпать вовремя.
+    Имя: {name}
+    Дата: {day}
+    Время: {time}
+    """
+}
+
+_config_path = CONFIG_FILE
+
+def data_path(str name) -> str:
+    """``name`` in the folder of the profile loaded last, where its archive, metrics and prefetched message live."""
+    return os.path.join(os.path.dirname(os.path.abspath(_config_path)), name)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def load_config(str path=CONFIG_FILE) -> Dict[str, Any]:
+    global _config_path
+    _config_path = path
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            return json.load(file)
+    return {
+        "language": "English",
+        "model": "gemma2-9b-it",
+        "prompt": DEFAULT_PROMPTS["English"]
+    }
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def save_config(dict config, str path=CONFIG_FILE) -> None:
+    with open(path, "w") as file:
+        json.dump(config, file, indent=4)
@@ -0,0 +1,93 @@
+# cython: language_level=3
+import cython
+import random
+from datetime import datetime
+from typing import Dict, Any
+
+DEFAULT_FIRST_TOKEN_DEADLINE_MS = 1500
+
+PHRASES = {
+    "English": {
+        "parts": ("Good morning", "Good afternoon", "Good evening"),
+        "days": ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+        "time_format": "%I:%M %p",
+        "greetings": (
+            "{part}, {name}!",
+            "Happy {day}, {name}!",
+            "Rise and shine, {name}, it's {time} on this lovely {day}!",
+            "{part}, {name}, and welcome to a brand new {day}!",
+        ),
+        "care": (
+            "Brush your teeth, wash your face and drink a glass of water.",
+            "Take a moment to look after yourself - a shower and fresh clothes work wonders.",
+            "Have a proper breakfast and check in with how you feel today.",
+            "Stretch for a minute, brush your teeth and give yourself a smile in the mirror.",
+        ),
+        "tasks": (
+            "Pick one task and finish it before you start the next.",
+            "Write down the three things that matter most today and tackle them one by one.",
+            "Small steps still count, so start with the easiest task on your list.",
+            "Set a timer for twenty minutes and get the first task done.",
+        ),
+        "closings": (
+            "And don't forget to go to bed on time tonight!",
+            "Be kind to yourself and get to bed on time.",
+            "You've got this - just remember to rest and sleep on time.",
+            "Wishing you a calm day and a good night's sleep on time.",
+        ),
+    },
+    "Russian": {
+        "parts": ("Доброе утро", "Добрый день", "Добрый вечер"),
+        "days": ("понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"),
+        "time_format": "%H:%M",
+        "greetings": (
+            "{part}, {name}!",
+            "С новым днём, {name}! Сегодня {day}, {time}.",
+            "Просыпайся, {name}, новый день уже начался!",
+            "{part}, {name}! Пусть сегодняшний день будет добрым.",
+        ),
+        "care": (
+            "Почисти зубы, умойся и выпей стакан воды.",
+            "Удели минутку себе - душ и чистая одежда творят чудеса.",
+            "Нормально позавтракай и прислушайся к своему состоянию.",
+            "Потянись, почисти зубы и улыбнись себе в зеркале.",
+        ),
+        "tasks": (
+            "Выбери одну задачу и доведи её до конца, прежде чем браться за следующую.",
+            "Запиши три самых важных дела на сегодня и выполняй их по очереди.",
+            "Маленькие шаги тоже считаются - начни с самой простой задачи.",
+            "Поставь таймер на двадцать минут и сделай первое дело.",
+        ),
+        "closings": (
+            "И не забудь сегодня лечь спать вовремя!",
+            "Будь к себе добрее и ложись спать вовремя.",
+            "У тебя всё получится - только отдыхай и засыпай вовремя.",
+            "Желаю спокойного дня и крепкого сна в своё время.",
+        ),
+    },
+}
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def local_morning_message(dict config, now=None) -> str:
+    """Compose a message from the phrase tables without contacting the API.
+
+    The same name, language, day and hour always give the same message.
+    """
+    cdef:
+        int hour, part
+        str name = config.get("name", "user")
+        str language = config.get("language", "English")
+        str day, time
+
+    if now is None:
+        now = datetime.now()
+    hour = now.hour
+    part = 0 if 5 <= hour < 12 else 1 if 12 <= hour < 18 else 2
+    phrases = PHRASES.get(language, PHRASES["English"])
+    day = phrases["days"][now.weekday()]
+    time = now.strftime(phrases["time_format"])
+
+    rng = random.Random(f"{name}|{language}|{now:%Y-%m-%d}|{hour}")
+    sentences = [rng.choice(phrases[group]) for group in ("greetings", "care", "tasks", "closings")]
+    return " ".join(sentences).format(name=name, day=day, time=time, part=phrases["parts"][part])
@@ -1,77 +1,587 @@
 # cython: language_level=3
 import cython
-from groq import Groq
-from utils_cy import CONFIG_FILE, DEFAULT_PROMPTS
-from datetime import datetime
-import sys
-from typing import Dict, Any, Generator
+from config_cy import CONFIG_FILE, DEFAULT_PROMPTS
+from cache_cy import cache_key, get_cache
+from clients_cy import get_client, create_async_client, DEFAULT_TRANSPORT
+from resilience_cy import classify_error, call_with_retry, async_call_with_retry
+from ratelimit_cy import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, estimate_tokens
+from telemetry_cy import GenerationTrace, get_metrics
+from history_cy import get_history, DEFAULT_DUPLICATE_SIMILARITY
+from datetime import datetime, timedelta
+import time
+import queue
+import sqlite3
+import threading
+from collections import deque
+from typing import Dict, Any, Callable, Generator, List, Optional, Sequence
 
 SYSTEM_PROMPTS = {
     "English": "You are a friendly morning assistant that provides encouraging messages in English.",
     "Russian": "Вы дружелюбный утренний ассистент, который предоставляет ободряющие сообщения на русском языке."
 }
 
+DEFAULT_TIME_BUCKET_MINUTES = 60
+DEFAULT_SLOT_TIMES = ("07:00", "13:00", "19:00")
+DEFAULT_BATCH_CONCURRENCY = 21  # the whole default week in a single round trip
+BATCH_POOL_SIZE = 8
+DEFAULT_HEDGE_DELAY_MS = 1000
+MIN_HEDGE_SAMPLES = 5
+DEFAULT_TEMPERATURE = 1.0
+DUPLICATE_TEMPERATURE = 1.5  # a second try after a near-duplicate strays further from the first
+
+_ttft_samples = {}
+_flights = {}
+_flights_lock = threading.Lock()
+
+def bucket_start(dict config, now=None) -> datetime:
+    """Round ``now`` down to the start of its ``time_bucket_minutes`` bucket."""
+    cdef:
+        int bucket = config.get("time_bucket_minutes", DEFAULT_TIME_BUCKET_MINUTES)
+        int minutes
+
+    if now is None:
+        now = datetime.now()
+    if bucket > 1:
+        minutes = now.hour * 60 + now.minute
+        minutes -= minutes % bucket
+        now = now.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+    return now
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def render_prompt(dict config, now=None) -> str:
+    """Fill the prompt template, rounding the time down to ``time_bucket_minutes``."""
+    cdef str day, time, name, language, prompt_template
+
+    now = bucket_start(config, now)
+    day = now.strftime("%A")
+    time = now.strftime("%I:%M %p")
+    name = config.get("name", "user")
+    language = config.get("language", "English")
+
+    prompt_template = config.get("prompt", DEFAULT_PROMPTS[language])
+    return prompt_template.format(name=name, day=day, time=time)
+
+def _request_messages(str language, str prompt) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPTS[language]
+        },
+        {
+            "role": "user",
+            "content": prompt.strip()
+        }
+    ]
+
+def request_models(dict config) -> List[str]:
+    """Return the primary ``model`` followed by any distinct backups listed in ``models``."""
+    cdef str model = config.get("model", "gemma2-9b-it")
+    models = [model]
+    for backup in config.get("models") or ():
+        if backup and backup not in models:
+            models.append(backup)
+    return models
+
+def record_ttft(str model, double seconds) -> None:
+    samples = _ttft_samples.get(model)
+    if samples is None:
+        samples = _ttft_samples[model] = deque(maxlen=50)
+    samples.append(seconds)
+
+def hedge_delay(dict config, str model) -> float:
+    """Seconds to wait for the first token from ``model`` before asking the next one: its median time to first token."""
+    samples = _ttft_samples.get(model)
+    if samples is not None and len(samples) >= MIN_HEDGE_SAMPLES:
+        return sorted(samples)[len(samples) // 2]
+    return config.get("hedge_delay_ms", DEFAULT_HEDGE_DELAY_MS) / 1000.0
+
+def _completion_tokens(chunk) -> Optional[int]:
+    usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+    return getattr(usage, "completion_tokens", None)
+
+def _open_stream(client, str model, list messages, double temperature):
+    if getattr(client, "native", False):
+        return client.stream_chat(model, messages, temperature=temperature, max_completion_tokens=1024, top_p=1)
+    return client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_completion_tokens=1024,
+        top_p=1,
+        stream=True,
+        stop=None,
+    )
+
+def _sdk_contents(completion, attempt=None, trace=None) -> Generator[str, None, None]:
+    for chunk in completion:
+        tokens = _completion_tokens(chunk)
+        if tokens is not None:
+            if trace is not None:
+                trace.tokens = tokens
+            if attempt is not None:
+                attempt.tokens = tokens
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
+def _stream_model(dict config, client, str model, list messages, attempt=None, trace=None,
+                  int priority=PRIORITY_INTERACTIVE) -> Generator[str, None, None]:
+    cdef:
+        double started = time.monotonic()
+        bint first = True
+        bint native = getattr(client, "native", False)
+        double temperature = config.get("temperature", DEFAULT_TEMPERATURE)
+        str content
+
+    # A hedged attempt that lost stops before it spends a request on the API.
+    cancelled = (lambda: attempt.cancelled) if attempt is not None else None
+    completion = call_with_retry(lambda: _open_stream(client, model, messages, temperature), config, model,
+                                 priority, estimate_tokens(messages), cancelled)
+    if attempt is not None:
+        attempt.completion = completion
+    try:
+        # The native transport yields the content strings themselves.
+        for content in (completion if native else _sdk_contents(completion, attempt, trace)):
+            if content:
+                if first:
+                    record_ttft(model, time.monotonic() - started)
+                    first = False
+                yield content
+        if native and completion.completion_tokens is not None:
+            if trace is not None:
+                trace.tokens = completion.completion_tokens
+            if attempt is not None:
+                attempt.tokens = completion.completion_tokens
+    finally:
+        completion.close()
+
+class _Attempt:
+    def __init__(self, str model, int priority):
+        self.model = model
+        self.priority = priority
+        self.completion = None
+        self.tokens = None
+        self.cancelled = False
+
+    def run(self, dict config, client, list messages, events) -> None:
+        try:
+            for content in _stream_model(config, client, self.model, messages, self, priority=self.priority):
+                if self.cancelled:
+                    return
+                events.put((self, content))
+            events.put((self, None))
+        except Exception as e:
+            if not self.cancelled:
+                events.put((self, e))
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        if self.completion is not None:
+            try:
+                self.completion.close()
+            except Exception:
+                pass
+
+def _launch_attempt(dict config, client, list models, list messages, list attempts, events, int priority) -> None:
+    attempt = _Attempt(models[len(attempts)], priority)
+    attempts.append(attempt)
+    threading.Thread(target=attempt.run, args=(config, client, messages, events), daemon=True).start()
+
+def _hedged_stream(dict config, client, list models, list messages, trace=None,
+                   int priority=PRIORITY_INTERACTIVE) -> Generator[str, None, None]:
+    """Stream from the first of ``models`` to produce a token.
+
+    The next model is asked when the current ones stay silent past their hedge
+    delay or fail. The first to answer wins and the others are cancelled.
+    ``trace`` gets the winning model and its token count.
+    """
+    cdef int failed = 0
+    events = queue.Queue()
+    cdef list attempts = []
+    winner = None
+    first_error = None
+
+    _launch_attempt(config, client, models, messages, attempts, events, priority)
+    try:
+        while True:
+            timeout = None
+            if winner is None and len(attempts) < len(models):
+                timeout = hedge_delay(config, attempts[len(attempts) - 1].model)
+            try:
+                attempt, item = events.get(timeout=timeout)
+            except queue.Empty:
+                _launch_attempt(config, client, models, messages, attempts, events, priority)
+                continue
+
+            if winner is not None and attempt is not winner:
+                continue
+            if isinstance(item, Exception):
+                if attempt is winner:
+                    raise item
+                failed += 1
+                if first_error is None:
+                    first_error = item
+                if len(attempts) < len(models):
+                    _launch_attempt(config, client, models, messages, attempts, events, priority)
+                elif failed == len(attempts):
+                    raise first_error
+                continue
+            if item is None:
+                if trace is not None:
+                    trace.tokens = attempt.tokens
+                return
+
+            if winner is None:
+                winner = attempt
+                if trace is not None:
+                    trace.model = attempt.model
+                for other in attempts:
+                    if other is not winner:
+                        other.cancel()
+            yield item
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+class _Flight:
+    """One upstream generation whose chunks are buffered for every request waiting on the same message."""
+
+    def __init__(self, str key):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cancelled = False
+        self.restarts = 0
+        self.followers = 0
+        self.condition = threading.Condition()
+
+    def add(self, str content) -> None:
+        with self.condition:
+            self.chunks.append(content)
+            self.condition.notify_all()
+
+    def restart(self) -> None:
+        """Drop the chunks so far; the message is generated again."""
+        with self.condition:
+            self.chunks = []
+            self.restarts += 1
+            self.condition.notify_all()
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def follow(self) -> Generator[Optional[str], None, None]:
+        """Yield the chunks received so far, then the rest as they arrive, and None when the message restarts."""
+        cdef Py_ssize_t index = 0
+        cdef int restarts = 0
+        cdef list pending
+        while True:
+            with self.condition:
+                while index >= len(self.chunks) and not self.done and restarts == self.restarts:
+                    self.condition.wait()
+                restarted = restarts != self.restarts
+                if restarted:
+                    restarts = self.restarts
+                    index = 0
+                pending = self.chunks[index:]
+                index += len(pending)
+                done, error = self.done, self.error
+            if restarted:
+                yield None
+            for content in pending:
+                yield content
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+def _join_flight(str key):
+    """Return the in-flight generation for ``key`` and whether the caller has to start it."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight(key)
+        flight.followers += 1
+        return flight, leader
+
+def _leave_flight(flight) -> None:
+    with _flights_lock:
+        flight.followers -= 1
+        if flight.followers == 0 and not flight.done:
+            # Nobody is waiting any more; stop paying for the rest of the stream.
+            flight.cancelled = True
+            if _flights.get(flight.key) is flight:
+                del _flights[flight.key]
+
+def _end_flight(flight) -> None:
+    with _flights_lock:
+        if _flights.get(flight.key) is flight:
+            del _flights[flight.key]
+
+def _stream_flight(flight, dict config, client, str model, list models, list messages, trace, int priority) -> str:
+    cdef str content, message = ""
+    if len(models) > 1:
+        completion = _hedged_stream(config, client, models, messages, trace, priority)
+    else:
+        completion = _stream_model(config, client, model, messages, trace=trace, priority=priority)
+    try:
+        for content in completion:
+            if flight.cancelled:
+                break
+            trace.chunk(len(content))
+            message += content
+            flight.add(content)
+    finally:
+        completion.close()
+    return message
+
+def _run_flight(flight, dict config, client, str model, list models, list messages, trace, cache, str key,
+                int priority) -> None:
+    cdef str message
+    cdef str name = config.get("name", "")
+    history = get_history(config)
+    try:
+        message = _stream_flight(flight, config, client, model, models, messages, trace, priority)
+        if (message and not flight.cancelled
+                and history.is_duplicate(name, message, config.get("duplicate_similarity", DEFAULT_DUPLICATE_SIMILARITY))):
+            # Too close to a recent morning: ask once more, a little more adventurously.
+            flight.restart()
+            message = _stream_flight(flight, dict(config, temperature=DUPLICATE_TEMPERATURE), client, model,
+                                     models, messages, trace, priority)
+    except Exception as api_error:
+        error = classify_error(api_error, model)
+        _end_flight(flight)
+        trace.finish(error)
+        _record_trace(config, trace)
+        flight.finish(error)
+        return
+
+    if flight.cancelled:
+        flight.finish()
+        return
+    if cache is not None and message:
+        cache.put(key, message)
+    _end_flight(flight)
+    trace.finish()
+    if message:
+        _archive(history, config, messages, message, trace.model, trace)
+    _record_trace(config, trace)
+    flight.finish()
+
+def _archive(history, dict config, list messages, str message, model, trace=None) -> None:
+    try:
+        history.add(config.get("name", ""), message, config.get("language", "English"), model,
+                    messages[len(messages) - 1]["content"], trace)
+    except sqlite3.Error:
+        # The message still reaches the screen when the archive is locked or unwritable.
+        pass
+
+def _record_trace(dict config, trace) -> None:
+    metrics = get_metrics(config)
+    if metrics is None:
+        return
+    try:
+        metrics.record(trace)
+    except OSError:
+        # Losing a sample is better than losing the message over a read-only folder.
+        pass
+
+def _check_config(dict config) -> None:
+    if not config.get("token"):
+        raise ValueError("API token is missing. Please set up your configuration first.")
+
+    if not config.get("model"):
+        raise ValueError("Model name is missing. Please set up your configuration first.")
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def generate_morning_message(dict config) -> str:
+def stream_morning_message(dict config, bint use_cache=True, now=None, trace=None,
+                           int priority=PRIORITY_INTERACTIVE,
+                           on_restart: Optional[Callable[[], None]] = None) -> Generator[str, None, None]:
+    """Yield the morning message piece by piece as the API streams it.
+
+    A cached message for the same prompt is yielded whole without contacting the API,
+    and requests for a message that is already being generated share that one call.
+    ``now`` overrides the date and time the message is written for. Timings are
+    recorded in ``trace``, a GenerationTrace, when given, and added to the metrics file.
+    Background work passes ``PRIORITY_BACKGROUND`` so it queues behind someone waiting
+    at the screen when the rate limit is tight.
+
+    A finished message too similar to one of the person's recent messages is
+    generated once more at a higher temperature. ``on_restart`` is then called
+    before the new message streams in, so everything yielded so far can be dropped.
+    """
     cdef:
-        str day, time, name, language, prompt_template, prompt, message, error_message
-    
+        str language, model, prompt, key, content, message
+
+    language = config.get("language", "English")
+    _check_config(config)
+
+    model = config.get("model", "gemma2-9b-it")
+    prompt = render_prompt(config, now)
+    if trace is None:
+        trace = GenerationTrace()
+    trace.model = model
+    trace.start()
+
+    cache = get_cache(config) if use_cache else None
+    key = cache_key(prompt, model, language, SYSTEM_PROMPTS[language])
+    if cache is not None:
+        message = cache.get(key)
+        if message is not None:
+            trace.cached = True
+            trace.chunk(len(message))
+            trace.finish()
+            _record_trace(config, trace)
+            yield message
+            return
+
+    flight, leader = _join_flight(f"{config.get('base_url')}|{key}")
     try:
+        if leader:
+            client = get_client(config.get("token"), config.get("base_url"), config.get("transport", DEFAULT_TRANSPORT))
+            threading.Thread(target=_run_flight, daemon=True, args=(
+                flight, config, client, model, request_models(config),
+                _request_messages(language, prompt), trace, cache, key, priority)).start()
+        else:
+            trace.shared = True
+
+        for content in flight.follow():
+            if content is None:
+                if on_restart is not None:
+                    on_restart()
+                continue
+            if not leader:
+                trace.chunk(len(content))
+            yield content
+    finally:
+        _leave_flight(flight)
+
+    if not leader:
+        trace.finish()
+        _record_trace(config, trace)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def generate_morning_message(dict config, now=None, bint use_cache=True, trace=None,
+                             int priority=PRIORITY_INTERACTIVE) -> str:
+    """Return the whole morning message. API failures raise GenerationError, a ValueError."""
+    cdef list parts = []
+    for content in stream_morning_message(config, use_cache, now, trace, priority, parts.clear):
+        parts.append(content)
+    return "".join(parts)
+
+
+def upcoming_slots(int days=7, times: Sequence[str] = DEFAULT_SLOT_TIMES, now=None) -> List[datetime]:
+    """Return the next ``days`` days of (day, time) slots at the given HH:MM times, skipping past ones."""
+    cdef int day_offset, hour, minute
+    if now is None:
         now = datetime.now()
-        day = now.strftime("%A")
-        time = now.strftime("%I:%M %p")
-        name = config.get("name", "user")
-        language = config.get("language", "English")
-        
-        if not config.get("token"):
-            raise ValueError("API token is missing. Please set up your configuration first.")
-        
-        if not config.get("model"):
-            raise ValueError("Model name is missing. Please set up your configuration first.")
-        
-        prompt_template = config.get("prompt", DEFAULT_PROMPTS[language])
-        prompt = prompt_template.format(name=name, day=day, time=time)
-
-        client = Groq(api_key=config.get("token"))
-        
+    slots = []
+    for day_offset in range(days + 1):
+        date = now + timedelta(days=day_offset)
+        for clock_time in times:
+            hour, minute = (int(part) for part in clock_time.split(":"))
+            slot = date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if slot > now:
+                slots.append(slot)
+    return slots[:days * len(times)]
+
+async def _complete(client, dict config, str model, list messages, double temperature) -> str:
+    # The raw response carries the rate limit headers for the limiter.
+    response = await async_call_with_retry(lambda: client.chat.completions.with_raw_response.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_completion_tokens=1024,
+        top_p=1,
+        stream=False,
+        stop=None,
+    ), config, model, PRIORITY_BACKGROUND, estimate_tokens(messages))
+    completion = await response.parse()
+    return completion.choices[0].message.content or ""
+
+async def _generate_slot(client, semaphore, dict config, slot, int index=0, on_result=None) -> Dict[str, Any]:
+    cdef:
+        str language = config.get("language", "English")
+        str model = config.get("model", "gemma2-9b-it")
+        str name = config.get("name", "")
+        str prompt = render_prompt(config, slot)
+        list messages = _request_messages(language, prompt)
+        str message
+
+    history = get_history(config)
+    async with semaphore:
         try:
-            completion = client.chat.completions.create(
-                model=config.get("model", "gemma2-9b-it"),
-                messages=[
-                    {
-                        "role": "system",
-                        "content": SYSTEM_PROMPTS[language]
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt.strip()
-                    }
-                ],
-                temperature=1,
-                max_completion_tokens=1024,
-                top_p=1,
-                stream=True,
-                stop=None,
-            )
-
-            message = ""
-            for chunk in completion:
-                message += chunk.choices[0].delta.content or ""
-            return message
-            
+            message = await _complete(client, config, model, messages, config.get("temperature", DEFAULT_TEMPERATURE))
+            if message and history.is_duplicate(name, message, config.get("duplicate_similarity", DEFAULT_DUPLICATE_SIMILARITY)):
+                message = await _complete(client, config, model, messages, DUPLICATE_TEMPERATURE)
+            if message:
+                _archive(history, config, messages, message, model)
+            result = {"time": slot, "prompt": prompt, "message": message, "error": None}
         except Exception as api_error:
-            error_message = str(api_error)
-            if "404" in error_message:
-                raise ValueError(f"Model '{config.get('model')}' not found. Please check the model name and try again.")
-            elif "401" in error_message:
-                raise ValueError("Invalid API token. Please check your token and try again.")
-            else:
-                raise ValueError(f"API Error: {error_message}")
-                
-    except ValueError as ve:
-        print(f"Error: {str(ve)}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+            result = {"time": slot, "prompt": prompt, "message": None, "error": str(classify_error(api_error, model))}
+    if on_result is not None:
+        on_result(index, result)
+    return result
+
+async def _generate_jobs(dict config, list jobs, int concurrency, on_result=None) -> List[Dict[str, Any]]:
+    import asyncio
+    from contextlib import AsyncExitStack
+    cdef int pools = (concurrency + BATCH_POOL_SIZE - 1) // BATCH_POOL_SIZE
+    semaphore = asyncio.Semaphore(concurrency)
+    async with AsyncExitStack() as stack:
+        # httpx scans its whole pool on every request, so one pool with hundreds of
+        # connections spends more CPU on bookkeeping than on the requests themselves.
+        clients = [await stack.enter_async_context(create_async_client(
+            config.get("token"), config.get("base_url"), min(concurrency, BATCH_POOL_SIZE))) for _ in range(pools)]
+        return list(await asyncio.gather(*[_generate_slot(clients[index % pools], semaphore, job_config, slot, index, on_result)
+                                           for index, (job_config, slot) in enumerate(jobs)]))
+
+def generate_batch(dict config, slots: Optional[Sequence[datetime]] = None, int concurrency=DEFAULT_BATCH_CONCURRENCY,
+                   bint persist=True) -> List[Dict[str, Any]]:
+    """Generate messages for many future slots at once, at most ``concurrency`` requests in flight.
+
+    Successful results are stored in the message cache until their time bucket ends,
+    so a launch during any of the slots shows its message without contacting the API.
+    Failed slots carry an ``error`` string instead of a ``message``.
+    """
+    cdef:
+        str language = config.get("language", "English")
+        str model = config.get("model", "gemma2-9b-it")
+
+    _check_config(config)
+    if slots is None:
+        slots = upcoming_slots()
+
+    # asyncio is only imported for batches; it would add ~50 ms to every headless run.
+    import asyncio
+    results = asyncio.run(_generate_jobs(config, [(config, slot) for slot in slots], max(1, concurrency)))
+
+    cache = get_cache(config) if persist else None
+    if cache is not None:
+        bucket = timedelta(minutes=max(1, config.get("time_bucket_minutes", DEFAULT_TIME_BUCKET_MINUTES)))
+        for result in results:
+            if result["message"]:
+                expires = bucket_start(config, result["time"]) + bucket
+                cache.put(cache_key(result["prompt"], model, language, SYSTEM_PROMPTS[language]),
+                          result["message"], expires.timestamp())
+    return results
+
+def generate_many(dict config, list configs, now=None, int concurrency=DEFAULT_BATCH_CONCURRENCY,
+                  on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """Generate one message for each of ``configs`` at once, at most ``concurrency`` requests in flight.
+
+    Requests go through ``config``'s token and endpoint. ``on_result(index, result)``
+    is called as each message finishes, in completion order.
+    """
+    _check_config(config)
+    if now is None:
+        now = datetime.now()
+    import asyncio
+    return asyncio.run(_generate_jobs(config, [(job, now) for job in configs], max(1, concurrency), on_result))
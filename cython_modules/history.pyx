@@ -0,0 +1,139 @@
+# cython: language_level=3
+import cython
+import re
+import sqlite3
+import threading
+from collections import deque
+from typing import Optional
+from archive_cy import get_archive
+
+DEFAULT_HISTORY_SIZE = 7
+DEFAULT_DUPLICATE_SIMILARITY = 0.75
+SHINGLE_SIZE = 5
+
+_WORD = re.compile(r"\w+")
+
+cdef unsigned long long FNV_OFFSET = 14695981039346656037ULL
+cdef unsigned long long FNV_PRIME = 1099511628211ULL
+
+cdef inline unsigned long long _mix(unsigned long long h):
+    # FNV leaves the low bits poorly mixed; every bit counts in a fingerprint.
+    h ^= h >> 33
+    h *= 0xff51afd7ed558ccdULL
+    h ^= h >> 33
+    h *= 0xc4ceb9fe1a85ec53ULL
+    h ^= h >> 33
+    return h
+
+cdef inline int _distance(unsigned long long a, unsigned long long b):
+    cdef unsigned long long x = a ^ b
+    cdef int bits = 0
+    while x:
+        x &= x - 1
+        bits += 1
+    return bits
+
+def normalize(str text) -> str:
+    """Lowercase words separated by single spaces, so punctuation and spacing do not matter."""
+    return " ".join(_WORD.findall(text.lower()))
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def simhash(str text) -> int:
+    """A 64-bit SimHash of the overlapping five-character shingles of ``text``.
+
+    Similar messages get fingerprints that differ in few bits.
+    """
+    cdef:
+        str normalized = normalize(text)
+        Py_ssize_t length = len(normalized)
+        Py_ssize_t size = min(SHINGLE_SIZE, length)
+        Py_ssize_t start, j
+        int bit
+        int counts[64]
+        unsigned long long h, fingerprint = 0
+        Py_UCS4 ch
+
+    if length == 0:
+        return 0
+    for bit in range(64):
+        counts[bit] = 0
+    for start in range(length - size + 1):
+        h = FNV_OFFSET
+        for j in range(start, start + size):
+            ch = normalized[j]
+            h = (h ^ <unsigned long long> ch) * FNV_PRIME
+        h = _mix(h)
+        for bit in range(64):
+            if (h >> bit) & 1:
+                counts[bit] += 1
+            else:
+                counts[bit] -= 1
+    for bit in range(64):
+        if counts[bit] > 0:
+            fingerprint |= 1ULL << bit
+    return fingerprint
+
+def similarity(unsigned long long a, unsigned long long b) -> float:
+    """The share of matching bits in two fingerprints, from 0.5 for unrelated texts to 1.0."""
+    return 1.0 - _distance(a, b) / 64.0
+
+class MessageHistory:
+    """The fingerprints of each person's last ``size`` messages, read from the archive once.
+
+    Only these are compared, so the check costs the same after years of mornings.
+    """
+
+    def __init__(self, archive, int size=DEFAULT_HISTORY_SIZE):
+        self.archive = archive
+        self.size = size
+        self.recent = {}
+        self.lock = threading.Lock()
+
+    def _recent(self, str name):
+        recent = self.recent.get(name)
+        if recent is None:
+            try:
+                fingerprints = self.archive.fingerprints(name, self.size)
+            except sqlite3.Error:
+                # An unreadable archive only means nothing counts as a repeat.
+                fingerprints = []
+            recent = self.recent[name] = deque(fingerprints, maxlen=self.size)
+        return recent
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def closest(self, str name, unsigned long long fingerprint) -> float:
+        """The highest similarity between ``fingerprint`` and ``name``'s recent messages, 0.0 if there are none."""
+        cdef int distance, best = 65
+        with self.lock:
+            recent = self._recent(name)
+            if not recent:
+                return 0.0
+            for other in recent:
+                distance = _distance(fingerprint, other)
+                if distance < best:
+                    best = distance
+        return 1.0 - best / 64.0
+
+    def is_duplicate(self, str name, str message, double threshold=DEFAULT_DUPLICATE_SIMILARITY) -> bool:
+        return self.closest(name, simhash(message)) >= threshold
+
+    def add(self, str name, str message, language: Optional[str] = None, model: Optional[str] = None,
+            prompt: Optional[str] = None, trace=None, now=None) -> None:
+        """Archive ``message`` and count it among ``name``'s recent ones."""
+        cdef unsigned long long fingerprint = simhash(message)
+        self.archive.add(name, message, language, model, prompt, fingerprint, trace, now)
+        with self.lock:
+            self._recent(name).append(fingerprint)
+
+_histories = {}
+
+def get_history(dict config) -> MessageHistory:
+    """Return the shared history; a ``history_size`` of 0 still archives messages but finds no duplicates."""
+    cdef int size = max(0, config.get("history_size", DEFAULT_HISTORY_SIZE))
+    archive = get_archive()
+    history = _histories.get(archive.path)
+    if history is None or history.size != size:
+        history = _histories[archive.path] = MessageHistory(archive, size)
+    return history
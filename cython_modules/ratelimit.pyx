@@ -0,0 +1,291 @@
+# cython: language_level=3
+import cython
+import os
+import re
+import json
+import time
+import heapq
+import hashlib
+import sqlite3
+import itertools
+import threading
+from typing import Any, Optional
+from archive_cy import get_archive
+
+# Groq's free tier; raise them in config.json on a paid plan, 0 turns a limit off.
+DEFAULT_RATE_LIMIT_RPM = 30
+DEFAULT_RATE_LIMIT_TPM = 6000
+ESTIMATED_COMPLETION_TOKENS = 256
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+POLL_INTERVAL = 0.05
+# A waiting process checks in at least this often; one silent for STALE_WAITER seconds has died.
+HEARTBEAT_INTERVAL = 0.5
+STALE_WAITER = 2.0
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+def parse_duration(value) -> Optional[float]:
+    """Seconds in a Groq reset header such as ``"2m59.56s"`` or ``"350ms"``."""
+    if not value:
+        return None
+    cdef double seconds = 0.0
+    parts = _DURATION_PART.findall(str(value))
+    if not parts:
+        return None
+    for number, unit in parts:
+        seconds += float(number) * _DURATION_UNITS[unit]
+    return seconds
+
+def _header(headers, str name) -> Optional[str]:
+    try:
+        return headers.get(name)
+    except AttributeError:
+        return None
+
+def _refill(double level, double capacity, double elapsed) -> float:
+    """``level`` after ``elapsed`` seconds of a bucket refilled with ``capacity`` units a minute."""
+    if capacity <= 0:
+        return level
+    return min(capacity, level + max(elapsed, 0.0) * capacity / 60.0)
+
+def _wait_time(double level, double capacity, double amount) -> float:
+    """Seconds until ``amount`` units are available; a request larger than the bucket waits for a full one.
+    A capacity of 0 never limits."""
+    if capacity <= 0:
+        return 0.0
+    amount = min(amount, capacity)
+    if level >= amount:
+        return 0.0
+    return (amount - level) * 60.0 / capacity
+
+class RateLimiter:
+    """Request and token budgets for one API key and model, shared by every generation path.
+
+    Callers take a ticket and wait their turn: the lowest priority number goes
+    first, then the oldest ticket, so an interactive launch overtakes queued
+    background work. Response headers keep the budgets in line with the server.
+
+    The budgets live in the archive database, so the window, the prefetch, the
+    server and bulk runs next to one profile draw on the same ones. Within a
+    process the queue is kept in memory; the ticket at its head stands for the
+    process in the ``rate_limit_waiters`` table, where tickets of other
+    processes are ranked the same way.
+    """
+
+    def __init__(self, archive, str key, double rpm=DEFAULT_RATE_LIMIT_RPM, double tpm=DEFAULT_RATE_LIMIT_TPM):
+        self.archive = archive
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    @property
+    def owner(self) -> str:
+        """This limiter's name among the waiters; a forked child inherits the object but not the name."""
+        return f"{os.getpid()}:{id(self)}"
+
+    def _load(self, connection, double now) -> list:
+        """The request level, token level, token capacity and pause end, refilled up to ``now``.
+
+        The token capacity is None until a response reports it; ``tpm`` stands in until then.
+        """
+        row = connection.execute("SELECT requests, tokens, token_capacity, updated, paused_until FROM rate_limits "
+                                 "WHERE key = ?", (self.key,)).fetchone()
+        if row is None:
+            return [self.rpm, self.tpm, None, 0.0]
+        requests = min(row[0], self.rpm) if self.rpm > 0 else row[0]
+        return [_refill(requests, self.rpm, now - row[3]), _refill(row[1], self._capacity(row[2]), now - row[3]),
+                row[2], row[4]]
+
+    def _capacity(self, capacity) -> float:
+        return capacity if capacity is not None else self.tpm
+
+    def _save(self, connection, list state, double now) -> None:
+        connection.execute("INSERT OR REPLACE INTO rate_limits (key, requests, tokens, token_capacity, updated, paused_until) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (self.key, state[0], state[1], state[2], now, state[3]))
+
+    def _take(self, ticket) -> float:
+        """Take the budget for the head of this process's queue if no other process is ahead of it;
+        otherwise return how long to wait."""
+        cdef double now = time.time()
+        cdef double wait
+        priority, _seq, tokens, since = ticket
+        try:
+            connection = self.archive.connection()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("DELETE FROM rate_limit_waiters WHERE heartbeat < ?", (now - STALE_WAITER,))
+                ahead = connection.execute(
+                    "SELECT 1 FROM rate_limit_waiters WHERE key = ? AND owner != ? "
+                    "AND (priority < ? OR (priority = ? AND since < ?)) LIMIT 1",
+                    (self.key, self.owner, priority, priority, since)).fetchone()
+                state = self._load(connection, now)
+                capacity = self._capacity(state[2])
+                wait = max(state[3] - now, _wait_time(state[0], self.rpm, 1), _wait_time(state[1], capacity, tokens))
+                if ahead is not None or wait > 0:
+                    connection.execute("INSERT OR REPLACE INTO rate_limit_waiters (key, owner, priority, since, heartbeat) "
+                                       "VALUES (?, ?, ?, ?, ?)", (self.key, self.owner, priority, since, now))
+                    return max(wait, POLL_INTERVAL) if ahead is not None else wait
+                connection.execute("DELETE FROM rate_limit_waiters WHERE key = ? AND owner = ?", (self.key, self.owner))
+                if self.rpm > 0:
+                    state[0] -= 1
+                if capacity > 0:
+                    state[1] -= min(tokens, capacity)
+                self._save(connection, state, now)
+        except sqlite3.Error:
+            # A locked or broken database only loses the shared budget; a 429 is still retried.
+            pass
+        return 0.0
+
+    def _try(self, ticket) -> float:
+        """Take the budget for ``ticket`` if it is next in line; otherwise return how long to wait."""
+        cdef double wait
+        if self.queue[0] is not ticket:
+            return POLL_INTERVAL
+        wait = self._take(ticket)
+        if wait > 0:
+            return min(wait, HEARTBEAT_INTERVAL)
+        heapq.heappop(self.queue)
+        self.condition.notify_all()
+        return 0.0
+
+    def _enqueue(self, int priority, double tokens) -> list:
+        ticket = [priority, next(self.counter), tokens, time.time()]
+        heapq.heappush(self.queue, ticket)
+        return ticket
+
+    def _withdraw(self, ticket) -> None:
+        try:
+            self.queue.remove(ticket)
+        except ValueError:
+            return
+        heapq.heapify(self.queue)
+        if not self.queue:
+            try:
+                with self.archive.connection() as connection:
+                    connection.execute("DELETE FROM rate_limit_waiters WHERE key = ? AND owner = ?", (self.key, self.owner))
+            except sqlite3.Error:
+                # The row goes stale and is dropped by the next caller.
+                pass
+        self.condition.notify_all()
+
+    def acquire(self, double tokens=0, int priority=PRIORITY_INTERACTIVE, cancelled=None) -> bool:
+        """Block until one request of about ``tokens`` tokens fits in the budget.
+
+        Returns False, without taking any budget, once ``cancelled()`` is true.
+        """
+        cdef double wait
+        with self.condition:
+            ticket = self._enqueue(priority, tokens)
+            try:
+                while True:
+                    if cancelled is not None and cancelled():
+                        self._withdraw(ticket)
+                        return False
+                    wait = self._try(ticket)
+                    if wait <= 0:
+                        return True
+                    self.condition.wait(wait if cancelled is None else min(wait, POLL_INTERVAL))
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+
+    async def acquire_async(self, double tokens=0, int priority=PRIORITY_BACKGROUND) -> None:
+        """The asyncio counterpart of acquire; it never blocks the event loop."""
+        import asyncio
+        cdef double wait
+        with self.condition:
+            ticket = self._enqueue(priority, tokens)
+        try:
+            while True:
+                with self.condition:
+                    wait = self._try(ticket)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait, POLL_INTERVAL * 4))
+        except BaseException:
+            with self.condition:
+                self._withdraw(ticket)
+            raise
+
+    def _adjust(self, level=None, capacity=None, double paused_until=0.0) -> None:
+        cdef double now = time.time()
+        with self.condition:
+            try:
+                connection = self.archive.connection()
+                with connection:
+                    connection.execute("BEGIN IMMEDIATE")
+                    state = self._load(connection, now)
+                    if capacity is not None and capacity > 0:
+                        state[2] = capacity
+                    if level is not None and self._capacity(state[2]) > 0:
+                        state[1] = min(self._capacity(state[2]), level)
+                    state[3] = max(state[3], paused_until)
+                    self._save(connection, state, now)
+            except sqlite3.Error:
+                return
+            self.condition.notify_all()
+
+    def update(self, headers) -> None:
+        """Align the budgets with the ``x-ratelimit-*`` headers of a response.
+
+        Groq reports tokens per minute, and requests per day, so the day's
+        request quota only matters once it runs out.
+        """
+        if headers is None:
+            return
+        limit_tokens = _header(headers, "x-ratelimit-limit-tokens")
+        remaining_tokens = _header(headers, "x-ratelimit-remaining-tokens")
+        remaining_requests = _header(headers, "x-ratelimit-remaining-requests")
+        paused_until = 0.0
+        try:
+            level = float(remaining_tokens) if remaining_tokens is not None else None
+            capacity = float(limit_tokens) if limit_tokens else None
+            if remaining_requests is not None and float(remaining_requests) <= 0:
+                reset = parse_duration(_header(headers, "x-ratelimit-reset-requests"))
+                if reset:
+                    paused_until = time.time() + reset
+        except ValueError:
+            return
+        if level is not None or paused_until:
+            self._adjust(level, capacity, paused_until)
+
+    def pause(self, double seconds) -> None:
+        """Hold every caller, in every process, back for ``seconds``, as asked by a 429's Retry-After."""
+        self._adjust(paused_until=time.time() + seconds)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(dict config, str model) -> RateLimiter:
+    """Return the limiter shared by every request with this API key to this endpoint and model."""
+    archive = get_archive()
+    # The key is stored in the archive, so it names the API token by its hash.
+    cdef str key = hashlib.sha256(json.dumps([config.get("token"), config.get("base_url"), model]).encode("utf-8")).hexdigest()
+    with _limiters_lock:
+        limiter = _limiters.get((archive.path, key))
+        if limiter is None:
+            limiter = _limiters[(archive.path, key)] = RateLimiter(archive, key,
+                                                                   config.get("rate_limit_rpm", DEFAULT_RATE_LIMIT_RPM),
+                                                                   config.get("rate_limit_tpm", DEFAULT_RATE_LIMIT_TPM))
+        return limiter
+
+def estimate_tokens(list messages) -> int:
+    """A rough token count for a request: about four characters per prompt token plus a typical reply."""
+    cdef int chars = 0
+    for message in messages:
+        chars += len(message.get("content") or "")
+    return chars // 4 + ESTIMATED_COMPLETION_TOKENS
+
+def response_headers(result: Any) -> Any:
+    """The HTTP headers behind an SDK or native response or API error, if any."""
+    headers = getattr(result, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(result, "response", None), "headers", None)
+    return headers
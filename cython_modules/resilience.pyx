@@ -0,0 +1,246 @@
+# cython: language_level=3
+import cython
+import time
+import random
+import threading
+from typing import Any, Awaitable, Callable, Optional
+from ratelimit_cy import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, POLL_INTERVAL, get_limiter, response_headers
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BASE_DELAY_MS = 500
+DEFAULT_RETRY_MAX_DELAY_MS = 8000
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 5
+DEFAULT_CIRCUIT_RESET_SECONDS = 60
+
+RETRYABLE_KINDS = ("rate_limit", "server", "timeout", "connection")
+
+class GenerationError(ValueError):
+    """An API failure sorted into a ``kind``: auth, not_found, rate_limit, server,
+    timeout, connection, bad_request, circuit_open or unknown."""
+
+    def __init__(self, str message, str kind="unknown", status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRYABLE_KINDS
+
+class RequestCancelled(Exception):
+    """The caller gave up on a request before it was sent or answered."""
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+def classify_error(error: Exception, str model) -> GenerationError:
+    """Turn an exception from the API client into a GenerationError with a user-facing message."""
+    if isinstance(error, GenerationError):
+        return error
+
+    status_code = getattr(error, "status_code", None)
+    cdef str name = type(error).__name__
+    cdef str message = str(error)
+
+    if status_code == 401:
+        return GenerationError("Invalid API token. Please check your token and try again.", "auth", status_code)
+    if status_code == 404:
+        return GenerationError(f"Model '{model}' not found. Please check the model name and try again.", "not_found", status_code)
+    if status_code == 429:
+        return GenerationError(f"Rate limit reached: {message}", "rate_limit", status_code, _retry_after(error))
+    if status_code is not None and status_code >= 500:
+        return GenerationError(f"API Error: {message}", "server", status_code, _retry_after(error))
+    if status_code is not None:
+        return GenerationError(f"API Error: {message}", "bad_request", status_code)
+    if isinstance(error, TimeoutError) or "Timeout" in name:
+        return GenerationError("The API took too long to respond.", "timeout")
+    if isinstance(error, (ConnectionError, OSError)) or "Connection" in name:
+        return GenerationError(f"Could not reach the API: {message}", "connection")
+    return GenerationError(f"API Error: {message}", "unknown")
+
+def backoff_delay(int attempt, double base, double cap) -> float:
+    """Full-jitter exponential backoff: a random delay up to ``base * 2**attempt``, at most ``cap``."""
+    return random.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """Stops calling the API for ``reset_seconds`` after ``failure_threshold`` failures in a row.
+
+    Once the pause is over, a single trial request is let through; its outcome
+    closes the circuit again or restarts the pause.
+    """
+
+    def __init__(self, int failure_threshold=DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+                 double reset_seconds=DEFAULT_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def before_request(self) -> bool:
+        """Raise while the circuit is open; return True when the caller is the trial request."""
+        cdef double remaining
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0 or self.trial_running:
+                raise GenerationError(
+                    f"The API is failing repeatedly; requests are paused for {max(remaining, 1.0):.0f} more seconds.",
+                    "circuit_open", retry_after=max(remaining, 0.0))
+            self.trial_running = True
+            return True
+
+    def abandon_trial(self) -> None:
+        """Let another request be the trial; this one was cancelled before it was sent."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(dict config) -> CircuitBreaker:
+    """Return the circuit breaker shared by every request to the configured endpoint."""
+    key = config.get("base_url")
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker()
+        breaker.failure_threshold = config.get("circuit_failure_threshold", DEFAULT_CIRCUIT_FAILURE_THRESHOLD)
+        breaker.reset_seconds = config.get("circuit_reset_seconds", DEFAULT_CIRCUIT_RESET_SECONDS)
+        return breaker
+
+class RetryPolicy:
+    """Decides whether and how long to wait before retrying a classified failure."""
+
+    def __init__(self, dict config, str model):
+        self.model = model
+        self.max_retries = config.get("max_retries", DEFAULT_MAX_RETRIES)
+        self.base_delay = config.get("retry_base_delay_ms", DEFAULT_RETRY_BASE_DELAY_MS) / 1000.0
+        self.max_delay = config.get("retry_max_delay_ms", DEFAULT_RETRY_MAX_DELAY_MS) / 1000.0
+        self.breaker = get_breaker(config)
+
+    def failed(self, error: Exception, int attempt) -> tuple:
+        """Record ``error`` and return it classified, with the delay before the next try or None to give up."""
+        error = classify_error(error, self.model)
+        if error.retryable:
+            self.breaker.record_failure()
+        else:
+            # The API answered, it just refused this request; that is no reason to stop calling it.
+            self.breaker.record_success()
+        if not error.retryable or attempt >= self.max_retries:
+            return error, None
+
+        if error.retry_after is not None:
+            # Waiting longer than the backoff cap would leave the caller hanging; fail fast instead.
+            return error, error.retry_after if error.retry_after <= self.max_delay else None
+        return error, backoff_delay(attempt, self.base_delay, self.max_delay)
+
+def _throttled(limiter, error: GenerationError, original: Exception, delay: Optional[float]) -> None:
+    """Feed a failed response's rate limit headers to the limiter, and hold everyone back after a 429."""
+    limiter.update(response_headers(original))
+    if error.kind == "rate_limit":
+        limiter.pause(error.retry_after if error.retry_after is not None else (delay or 0.0))
+
+def _sleep(double delay, cancelled: Optional[Callable[[], bool]]) -> bool:
+    """Sleep for ``delay`` seconds, or less if ``cancelled()`` turns true; return False in that case."""
+    if cancelled is None:
+        time.sleep(delay)
+        return True
+    cdef double until = time.monotonic() + delay
+    while not cancelled():
+        delay = until - time.monotonic()
+        if delay <= 0:
+            return True
+        time.sleep(min(delay, POLL_INTERVAL))
+    return False
+
+def call_with_retry(func: Callable[[], Any], dict config, str model, int priority=PRIORITY_INTERACTIVE,
+                    double tokens=0, cancelled: Optional[Callable[[], bool]] = None) -> Any:
+    """Call ``func`` behind the endpoint's circuit breaker, retrying retryable failures with backoff.
+
+    Every try first waits its turn in the model's rate limiter for one request
+    of about ``tokens`` tokens, queued by ``priority``. Once ``cancelled()`` is
+    true, nothing more is sent and RequestCancelled is raised; a response that
+    arrives after that is closed unread.
+    """
+    cdef int attempt = 0
+    cdef bint trial
+    policy = RetryPolicy(config, model)
+    limiter = get_limiter(config, model)
+    while True:
+        trial = policy.breaker.before_request()
+        if not limiter.acquire(tokens, priority, cancelled) or (cancelled is not None and cancelled()):
+            if trial:
+                policy.breaker.abandon_trial()
+            raise RequestCancelled()
+        try:
+            result = func()
+        except Exception as e:
+            error, delay = policy.failed(e, attempt)
+            _throttled(limiter, error, e, delay)
+            if delay is None:
+                if error is e:
+                    raise
+                raise error from e
+            if not _sleep(delay, cancelled):
+                raise RequestCancelled() from e
+            attempt += 1
+            continue
+        policy.breaker.record_success()
+        limiter.update(response_headers(result))
+        if cancelled is not None and cancelled():
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+            raise RequestCancelled()
+        return result
+
+async def async_call_with_retry(func: Callable[[], Awaitable[Any]], dict config, str model,
+                                int priority=PRIORITY_BACKGROUND, double tokens=0) -> Any:
+    """The asyncio counterpart of call_with_retry."""
+    import asyncio
+    cdef int attempt = 0
+    policy = RetryPolicy(config, model)
+    limiter = get_limiter(config, model)
+    while True:
+        policy.breaker.before_request()
+        await limiter.acquire_async(tokens, priority)
+        try:
+            result = await func()
+        except Exception as e:
+            error, delay = policy.failed(e, attempt)
+            _throttled(limiter, error, e, delay)
+            if delay is None:
+                if error is e:
+                    raise
+                raise error from e
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        policy.breaker.record_success()
+        limiter.update(response_headers(result))
+        return result
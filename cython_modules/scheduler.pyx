@@ -0,0 +1,102 @@
+# cython: language_level=3
+import cython
+import os
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable
+from config_cy import PREFETCH_FILE, data_path, load_config
+from generation_cy import generate_morning_message
+from ratelimit_cy import PRIORITY_BACKGROUND
+
+DEFAULT_WAKE_TIME = "08:00"
+DEFAULT_PREFETCH_TIME = "04:00"
+DEFAULT_PREFETCH_MAX_AGE_HOURS = 4
+RETRY_DELAY = 15 * 60
+
+def prefetch_path() -> str:
+    return data_path(PREFETCH_FILE)
+
+def prefetch_inputs(dict config) -> Dict[str, Any]:
+    return {
+        "name": config.get("name", "user"),
+        "language": config.get("language", "English"),
+        "model": config.get("model", "gemma2-9b-it"),
+        "prompt": config.get("prompt"),
+    }
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def next_occurrence(str clock_time, now=None) -> datetime:
+    """Return the next moment after ``now`` that the clock shows ``clock_time`` (HH:MM)."""
+    cdef int hour, minute
+    if now is None:
+        now = datetime.now()
+    hour, minute = (int(part) for part in clock_time.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return target
+
+def prefetch_message(dict config, now=None) -> Dict[str, Any]:
+    """Generate the message for the next wake time and store it for the window to pick up."""
+    target = next_occurrence(config.get("wake_time", DEFAULT_WAKE_TIME), now)
+    cdef str message = generate_morning_message(config, target, use_cache=False, priority=PRIORITY_BACKGROUND)
+    if not message:
+        raise ValueError("API returned an empty message.")
+
+    entry = {
+        "target": target.isoformat(),
+        "inputs": prefetch_inputs(config),
+        "message": message,
+        "created": time.time(),
+    }
+    cdef str path = prefetch_path()
+    cdef str tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(entry, file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+    return entry
+
+def load_prefetched(dict config, now=None) -> Optional[str]:
+    """Return the prefetched message if it was made for these settings and is due around now."""
+    try:
+        with open(prefetch_path(), "r", encoding="utf-8") as file:
+            entry = json.load(file)
+        target = datetime.fromisoformat(entry["target"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if now is None:
+        now = datetime.now()
+    max_age = timedelta(hours=config.get("prefetch_max_age_hours", DEFAULT_PREFETCH_MAX_AGE_HOURS))
+    if entry.get("inputs") != prefetch_inputs(config):
+        return None
+    if now.date() != target.date() or abs(now - target) > max_age:
+        return None
+    return entry.get("message") or None
+
+def run_scheduler(config_loader: Callable[[], Dict[str, Any]] = load_config, bint once=False) -> None:
+    """Prefetch tomorrow's message every night at ``prefetch_time``, retrying until the wake time."""
+    cdef double delay
+    while True:
+        config = config_loader()
+        if not once:
+            delay = (next_occurrence(config.get("prefetch_time", DEFAULT_PREFETCH_TIME)) - datetime.now()).total_seconds()
+            time.sleep(delay)
+            config = config_loader()
+
+        wake = next_occurrence(config.get("wake_time", DEFAULT_WAKE_TIME))
+        while True:
+            try:
+                entry = prefetch_message(config)
+                print(f"Prefetched message for {entry['target']}")
+                break
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+                if once or datetime.now() + timedelta(seconds=RETRY_DELAY) >= wake:
+                    break
+                time.sleep(RETRY_DELAY)
+
+        if once:
+            return
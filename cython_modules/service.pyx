@@ -0,0 +1,248 @@
+# cython: language_level=3
+import cython
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Dict, Any, Optional, Tuple
+from config_cy import DEFAULT_PROMPTS
+from cache_cy import cache_key, DEFAULT_CACHE_TTL
+from generation_cy import (SYSTEM_PROMPTS, DEFAULT_TIME_BUCKET_MINUTES, bucket_start, render_prompt,
+                           generate_morning_message)
+from fallback_cy import local_morning_message
+from telemetry_cy import GenerationTrace
+
+DEFAULT_SERVICE_WORKERS = 8
+DEFAULT_SERVICE_QUEUE = 256
+DEFAULT_SERVICE_MEMORY_ENTRIES = 4096
+MAX_HEADER_BYTES = 16384
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+class ServiceError(Exception):
+    def __init__(self, int status, str message):
+        super().__init__(message)
+        self.status = status
+
+class MemoryCache:
+    """Messages kept in memory until their time bucket ends, least recently used dropped first."""
+
+    def __init__(self, int max_entries=DEFAULT_SERVICE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, str key) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[1]:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, str key, str message, double seconds) -> None:
+        self.entries[key] = (message, time.monotonic() + seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+class MessageService:
+    """Morning messages over HTTP for many people, from one profile's token and model.
+
+    ``GET /message?name=Ann&language=English&timezone=Europe/Berlin`` answers from
+    memory, then the on-disk message cache, and only then asks the API through a
+    bounded pool of worker threads. ``GET /stats`` reports the hit ratio and queue depth.
+    """
+
+    def __init__(self, dict config, int workers=DEFAULT_SERVICE_WORKERS, int max_queue=DEFAULT_SERVICE_QUEUE):
+        self.config = config
+        self.workers = workers
+        self.max_queue = max_queue
+        self.memory = MemoryCache(config.get("service_memory_entries", DEFAULT_SERVICE_MEMORY_ENTRIES))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation")
+        self.pending = {}
+        self.queued = 0
+        self.running = 0
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "memory_hits": 0, "disk_hits": 0, "generated": 0, "shared": 0, "fallbacks": 0, "rejected": 0,
+                      "errors": 0}
+        self.started = time.time()
+
+    def user_config(self, str name, str language) -> Dict[str, Any]:
+        if language not in SYSTEM_PROMPTS:
+            raise ServiceError(400, f"Unsupported language '{language}'. Use one of: {', '.join(SYSTEM_PROMPTS)}.")
+        return dict(self.config, name=name, language=language, prompt=DEFAULT_PROMPTS[language])
+
+    def _generate(self, dict config, now) -> Tuple[str, GenerationTrace]:
+        trace = GenerationTrace()
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return generate_morning_message(config, now, trace=trace), trace
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    async def message(self, str name, str language, str timezone) -> Dict[str, Any]:
+        cdef int bucket = self.config.get("time_bucket_minutes", DEFAULT_TIME_BUCKET_MINUTES)
+        cdef double seconds
+        cdef bint joined = False
+        try:
+            zone = ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ServiceError(400, f"Unknown timezone '{timezone}'.")
+
+        config = self.user_config(name, language)
+        now = datetime.now(zone).replace(tzinfo=None)
+        prompt = render_prompt(config, now)
+        key = cache_key(prompt, config.get("model", "gemma2-9b-it"), language, SYSTEM_PROMPTS[language])
+        result = {"name": name, "language": language, "timezone": timezone, "time": now.isoformat(timespec="seconds")}
+
+        message = self.memory.get(key)
+        if message is not None:
+            self.stats["memory_hits"] += 1
+            return dict(result, message=message, source="memory")
+
+        future = self.pending.get(key)
+        if future is None:
+            if self.queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise ServiceError(503, "Too many messages are being generated; try again shortly.")
+            with self.lock:
+                self.queued += 1
+            future = self.pending[key] = asyncio.get_running_loop().run_in_executor(
+                self.executor, self._generate, config, now)
+            future.add_done_callback(lambda done, key=key: self.pending.pop(key, None))
+        else:
+            joined = True
+
+        try:
+            message, trace = await asyncio.shield(future)
+        except ValueError as e:
+            self.stats["fallbacks"] += 1
+            return dict(result, message=local_morning_message(config, now), source="fallback", error=str(e))
+
+        if joined:
+            self.stats["shared"] += 1
+            return dict(result, message=message, source="shared")
+
+        # Keep it until the prompt's time bucket ends, when the next request asks for a new message.
+        seconds = (bucket_start(config, now) + timedelta(minutes=max(1, bucket)) - now).total_seconds()
+        self.memory.put(key, message, min(seconds, self.config.get("cache_ttl", DEFAULT_CACHE_TTL)))
+        if trace.cached:
+            self.stats["disk_hits"] += 1
+            return dict(result, message=message, source="disk")
+        self.stats["generated"] += 1
+        return dict(result, message=message, source="api")
+
+    def snapshot(self) -> Dict[str, Any]:
+        cdef int hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["shared"]
+        cdef int answered = hits + self.stats["generated"] + self.stats["fallbacks"]
+        return dict(
+            self.stats,
+            hit_ratio=hits / answered if answered else None,
+            queue_depth=self.queued,
+            generating=self.running,
+            workers=self.workers,
+            memory_entries=len(self.memory.entries),
+            uptime=time.time() - self.started,
+        )
+
+    async def route(self, str method, str target) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(target)
+        if url.path not in ("/message", "/stats"):
+            raise ServiceError(404, f"No such endpoint: {url.path}")
+        if method not in ("GET", "HEAD"):
+            raise ServiceError(405, "Only GET is supported.")
+        if url.path == "/stats":
+            return 200, self.snapshot()
+
+        self.stats["requests"] += 1
+        query = parse_qs(url.query)
+        name = (query.get("name") or [""])[0].strip()
+        if not name:
+            raise ServiceError(400, "The name parameter is required.")
+        language = (query.get("language") or ["English"])[0]
+        timezone = (query.get("timezone") or ["UTC"])[0]
+        return 200, await self.message(name, language, timezone)
+
+    async def handle(self, reader, writer) -> None:
+        """Serve HTTP/1.1 requests on one connection until the client closes it."""
+        cdef bint keep_alive = True
+        try:
+            while keep_alive:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                parts = lines[0].split(" ")
+                if len(parts) != 3:
+                    return
+                method, target, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    # The body cannot be skipped without its length, so the connection ends after the reply.
+                    keep_alive = False
+                    status, payload = 400, {"error": "Invalid Content-Length header."}
+                else:
+                    if length:
+                        await reader.readexactly(length)
+                    try:
+                        status, payload = await self.route(method, target)
+                    except ServiceError as e:
+                        status, payload = e.status, {"error": str(e)}
+                    except Exception as e:
+                        # An unwritable archive or a bug must not cost the client its answer, nor the connection.
+                        print(f"Error: {type(e).__name__}: {e}", flush=True)
+                        self.stats["errors"] += 1
+                        status, payload = 500, {"error": f"Internal error: {e}"}
+
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                response = [
+                    f"HTTP/1.1 {status} {REASONS[status]}",
+                    "Content-Type: application/json; charset=utf-8",
+                    f"Content-Length: {len(body)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                if status == 503:
+                    response.append("Retry-After: 5")
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, str host, int port) -> None:
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+        print(f"Serving morning messages on {addresses}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+def run_service(dict config, str host="127.0.0.1", int port=8080, int workers=DEFAULT_SERVICE_WORKERS,
+                int max_queue=DEFAULT_SERVICE_QUEUE) -> None:
+    asyncio.run(MessageService(config, workers, max_queue).serve(host, port))
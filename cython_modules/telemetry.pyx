@@ -0,0 +1,279 @@
+# cython: language_level=3
+import cython
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Sequence
+from config_cy import METRICS_FILE, data_path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+MS_BOUNDS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+CHUNK_CHARS_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+TOKENS_PER_SECOND_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000)
+
+HISTOGRAM_BOUNDS = {
+    "ttft_ms": MS_BOUNDS,
+    "total_ms": MS_BOUNDS,
+    "inter_chunk_ms": MS_BOUNDS,
+    "chunk_chars": CHUNK_CHARS_BOUNDS,
+    "tokens_per_second": TOKENS_PER_SECOND_BOUNDS,
+    "first_character_ms": MS_BOUNDS,
+}
+
+class GenerationTrace:
+    """Timings of one generation: request start, every chunk's arrival and size, token count and end.
+
+    Times are ``time.perf_counter()`` readings; the properties turn them into durations.
+    """
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self.cached = False
+        self.shared = False
+        self.started = None
+        self.chunk_times = []
+        self.chunk_sizes = []
+        self.tokens = None
+        self.ended = None
+        self.error = None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+
+    def chunk(self, int size) -> None:
+        self.chunk_times.append(time.perf_counter())
+        self.chunk_sizes.append(size)
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        self.ended = time.perf_counter()
+        if error is not None:
+            self.error = type(error).__name__
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from the request to the first chunk."""
+        if self.started is None or not self.chunk_times:
+            return None
+        return self.chunk_times[0] - self.started
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started is None or self.ended is None:
+            return None
+        return self.ended - self.started
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def chunk_gaps(self) -> List[float]:
+        """Seconds between consecutive chunks."""
+        cdef list times = self.chunk_times
+        cdef Py_ssize_t i
+        return [times[i] - times[i - 1] for i in range(1, len(times))]
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Tokens streamed per second after the first chunk, or chunks when the API reports no usage."""
+        cdef Py_ssize_t count = len(self.chunk_times)
+        if count < 2:
+            return None
+        cdef double streaming = self.chunk_times[count - 1] - self.chunk_times[0]
+        if streaming <= 0:
+            return None
+        return (self.tokens if self.tokens else count) / streaming
+
+    def summary(self) -> Dict[str, Any]:
+        ttft, duration = self.ttft, self.duration
+        return {
+            "model": self.model,
+            "cached": self.cached,
+            "shared": self.shared,
+            "ttft_ms": None if ttft is None else ttft * 1000,
+            "total_ms": None if duration is None else duration * 1000,
+            "chunks": len(self.chunk_sizes),
+            "chars": sum(self.chunk_sizes),
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "error": self.error,
+        }
+
+class Histogram:
+    """Counts of observations falling under each upper bound, plus one overflow bucket."""
+
+    def __init__(self, bounds: Sequence[float], counts: Optional[List[int]] = None,
+                 int count=0, double total=0.0, minimum=None, maximum=None):
+        self.bounds = tuple(bounds)
+        self.counts = list(counts) if counts else [0] * (len(self.bounds) + 1)
+        self.count = count
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def observe(self, double value) -> None:
+        cdef Py_ssize_t i = 0
+        cdef Py_ssize_t last = len(self.bounds)
+        while i < last and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def quantile(self, double q) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile (the maximum for the overflow bucket)."""
+        if not self.count:
+            return None
+        cdef double rank = q * self.count
+        cdef long seen = 0
+        cdef Py_ssize_t i
+        for i in range(len(self.counts)):
+            seen += self.counts[i]
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.maximum
+        return self.maximum
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bounds": list(self.bounds),
+            "counts": self.counts,
+            "count": self.count,
+            "sum": self.total,
+            "min": self.minimum,
+            "max": self.maximum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+    @classmethod
+    def from_dict(cls, dict data, bounds: Sequence[float]) -> "Histogram":
+        if list(data.get("bounds", ())) != list(bounds):
+            return cls(bounds)
+        return cls(bounds, data.get("counts"), data.get("count", 0), data.get("sum", 0.0),
+                   data.get("min"), data.get("max"))
+
+def metrics_path() -> str:
+    return data_path(METRICS_FILE)
+
+@contextmanager
+def _file_lock(str path):
+    """Hold an exclusive lock on ``path`` across processes."""
+    with open(path, "a+b") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class MetricsStore:
+    """Histograms per model, kept in a JSON file next to the config.
+
+    Each generation adds its time to first chunk, total time, gaps between
+    chunks, chunk sizes and streaming speed; the window adds the time until
+    the first character is on screen under ``"window"``.
+
+    The window, the prefetcher, headless runs and the server may all write
+    the file, so every update reads it again under a file lock and adds to
+    what is there.
+    """
+
+    def __init__(self, str path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, dict data) -> None:
+        cdef str tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def _update(self):
+        """The stored metrics to change in place; they are written back when the block ends."""
+        with self.lock, _file_lock(self.path + ".lock"):
+            data = self._load()
+            yield data
+            self._save(data)
+
+    def _section(self, dict data, str name) -> Dict[str, Any]:
+        section = data.setdefault(name, {"requests": 0, "cached": 0, "errors": 0, "histograms": {}})
+        section.setdefault("shared", 0)
+        return section
+
+    def _observe(self, dict section, str name, values) -> None:
+        if not values:
+            return
+        histogram = Histogram.from_dict(section["histograms"].get(name, {}), HISTOGRAM_BOUNDS[name])
+        for value in values:
+            histogram.observe(value)
+        section["histograms"][name] = histogram.to_dict()
+
+    def observe(self, str section, str name, double value) -> None:
+        """Add a single ``value`` to the ``name`` histogram of ``section``."""
+        with self._update() as data:
+            self._observe(self._section(data, section), name, (value,))
+
+    def record(self, trace: GenerationTrace) -> None:
+        """Add a finished trace to the histograms of its model."""
+        with self._update() as data:
+            section = self._section(data, trace.model or "unknown")
+            section["requests"] += 1
+            if trace.cached:
+                section["cached"] += 1
+            if trace.shared:
+                section["shared"] += 1
+            if trace.error is not None:
+                section["errors"] += 1
+
+            # Cache hits and requests sharing another one's call never reach the API
+            # themselves, so they would only skew its latency figures.
+            if not trace.cached and not trace.shared:
+                if trace.ttft is not None:
+                    self._observe(section, "ttft_ms", (trace.ttft * 1000,))
+                if trace.error is None and trace.duration is not None:
+                    self._observe(section, "total_ms", (trace.duration * 1000,))
+                self._observe(section, "inter_chunk_ms", [gap * 1000 for gap in trace.chunk_gaps()])
+                self._observe(section, "chunk_chars", trace.chunk_sizes)
+                if trace.tokens_per_second is not None:
+                    self._observe(section, "tokens_per_second", (trace.tokens_per_second,))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self._load()
+
+_stores = {}
+
+def get_metrics(dict config) -> Optional[MetricsStore]:
+    """Return the shared metrics store, or None when ``metrics`` is turned off in the config."""
+    if not config.get("metrics", True):
+        return None
+    cdef str path = metrics_path()
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = MetricsStore(path)
+    return store
@@ -0,0 +1,168 @@
+# cython: language_level=3
+import cython
+import ssl
+import json
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit
+from typing import Any, Generator, Optional
+
+DEFAULT_BASE_URL = "https://api.groq.com"
+CHAT_COMPLETIONS_PATH = "/openai/v1/chat/completions"
+DEFAULT_TIMEOUT = 60.0
+
+class APIStatusError(Exception):
+    """An error response from the API, shaped like the SDK's so classify_error treats both alike."""
+
+    def __init__(self, str message, status_code: Optional[int] = None, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers
+
+class NativeStream:
+    """A streamed chat completion yielding only the ``delta.content`` strings.
+
+    The SSE body is parsed line by line as it arrives; no chunk objects are
+    built. ``completion_tokens`` is filled from the usage chunk at the end.
+    """
+
+    def __init__(self, client, connection, response):
+        self.client = client
+        self.connection = connection
+        self.response = response
+        self.completion_tokens = None
+        self.finished = False
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def __iter__(self) -> Generator[str, None, None]:
+        cdef bytes line, payload
+        response = self.response
+        while True:
+            line = response.readline()
+            if not line:
+                break
+            if not line.startswith(b"data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == b"[DONE]":
+                # Read the end of the chunked body so the connection can be reused.
+                response.read()
+                self.finished = True
+                break
+
+            event = json.loads(payload)
+            if "error" in event:
+                error = event["error"]
+                raise APIStatusError(f"API Error: {error.get('message', error)}")
+            usage = (event.get("x_groq") or {}).get("usage") or event.get("usage")
+            if usage:
+                self.completion_tokens = usage.get("completion_tokens")
+            choices = event.get("choices")
+            if choices:
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+        self.close()
+
+    def close(self) -> None:
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return
+        if self.finished and not self.response.will_close:
+            self.client.release(connection)
+        else:
+            # An unfinished stream leaves the rest of the body on the socket.
+            connection.close()
+
+class NativeClient:
+    """A minimal OpenAI-compatible chat completions client on http.client.
+
+    It skips the SDK's import cost and per-chunk pydantic models, and keeps
+    up to ``max_connections`` idle connections for reuse.
+    """
+    native = True
+
+    def __init__(self, str token, base_url: Optional[str] = None, int max_connections=4,
+                 double keepalive_expiry=120.0, double timeout=DEFAULT_TIMEOUT):
+        url = urlsplit((base_url or DEFAULT_BASE_URL).rstrip("/"))
+        self.token = token
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path + CHAT_COMPLETIONS_PATH
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+        self.ssl_context = ssl.create_default_context() if self.https else None
+
+    def _connect(self):
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """Return an idle connection that has not expired, or None."""
+        cdef double now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                connection, released = self.idle.pop()
+                if now - released < self.keepalive_expiry:
+                    return connection
+                connection.close()
+        return None
+
+    def release(self, connection) -> None:
+        with self.lock:
+            if len(self.idle) < self.max_connections:
+                self.idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def connect(self) -> None:
+        """Open a connection ahead of the first request, so it does not wait for DNS, TCP and TLS."""
+        connection = self._connect()
+        connection.connect()
+        self.release(connection)
+
+    def _send(self, connection, bytes body) -> Any:
+        connection.request("POST", self.path, body=body, headers={
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        })
+        return connection.getresponse()
+
+    def stream_chat(self, str model, list messages, **params) -> NativeStream:
+        """Start a streamed chat completion; raises APIStatusError for error responses."""
+        cdef bytes body = json.dumps(dict(params, model=model, messages=messages, stream=True)).encode("utf-8")
+        connection = self.acquire()
+        if connection is not None:
+            try:
+                response = self._send(connection, body)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # The server dropped the idle connection; try once more on a fresh one.
+                connection.close()
+                connection = None
+        if connection is None:
+            connection = self._connect()
+            try:
+                response = self._send(connection, body)
+            except BaseException:
+                connection.close()
+                raise
+
+        if response.status >= 400:
+            detail = response.read().decode("utf-8", "replace")
+            connection.close()
+            raise APIStatusError(f"Error code: {response.status} - {detail}", response.status, response.headers)
+        return NativeStream(self, connection, response)
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _released in idle:
+            connection.close()
@@ -17,30 +17,16 @@ from datetime import datetime
 from PIL import Image
 import numpy as np
 cimport numpy as np
+from config_cy import (CONFIG_FILE, ARCHIVE_FILE, PREFETCH_FILE, METRICS_FILE, DEFAULT_PROMPTS,
+                       load_config, save_config)
 
 # Constants
-CONFIG_FILE = "config.json"
 ASSETS_DIR = "data"
 USER_ASSETS_DIR = "data/user"
 
 IMAGE_SIZE = (300, 300)
 IMAGE_QUALITY = 85
 
-DEFAULT_PROMPTS = {
-    "English": """
-    Generate a single-line morning wish that encourages the person to: take care of themselves, their appearance, their well-being, complete tasks, brush their teeth, and go to bed on time.
-    Name: {name}
-    Date: {day}
-    Time: {time}
-    """,
-    "Russian": """
-    Сгенерируй в одну строку пожелания на доброе утро, так же человек должен: заботиться о себе, о внешности, о состоянии, выполнять задачи, чистить зубы и засыпать вовремя.
-    Имя: {name}
-    Дата: {day}
-    Время: {time}
-    """
-}
-
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def ensure_directories():
@@ -121,24 +107,6 @@ def get_character_images():
         "open": user_open if os.path.exists(user_open) else default_open
     }
 
-@cython.boundscheck(False)
-@cython.wraparound(False)
-def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as file:
-            return json.load(file)
-    return {
-        "language": "English",
-        "model": "gemma2-9b-it",
-        "prompt": DEFAULT_PROMPTS["English"]
-    }
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-def save_config(dict config):
-    with open(CONFIG_FILE, "w") as file:
-        json.dump(config, file, indent=4)
-
 def initialize_pygame():
     pygame.mixer.init()
 
@@ -0,0 +1,34 @@
+import argparse
+import json
+import sys
+from config_cy import CONFIG_FILE, load_config
+from generation_cy import stream_morning_message, generate_morning_message
+from telemetry_cy import GenerationTrace
+
+# Imports only what generation needs (no PyQt5, pygame, PIL or numpy), so cron
+# jobs and login scripts pay little more than the API call itself.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the morning message without opening the window.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="profile to generate for (default: config.json)")
+    parser.add_argument("--json", action="store_true", help="print the message and its timings as JSON")
+    parser.add_argument("--no-cache", action="store_true", help="always ask the API instead of reusing a cached message")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    trace = GenerationTrace()
+    try:
+        if args.json:
+            message = generate_morning_message(config, use_cache=not args.no_cache, trace=trace)
+            json.dump(dict(trace.summary(), message=message), sys.stdout, ensure_ascii=False, indent=4)
+            print()
+        elif sys.stdout.isatty():
+            # A near-duplicate is written again on a new line; the last line is the message.
+            for content in stream_morning_message(config, not args.no_cache, trace=trace, on_restart=print):
+                print(content, end="", flush=True)
+            print()
+        else:
+            # Scripts reading the output get only the final message.
+            print(generate_morning_message(config, use_cache=not args.no_cache, trace=trace))
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
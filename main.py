@@ -1,15 +1,410 @@
 import resources_rc
 from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout, QPushButton, 
                             QHBoxLayout, QLineEdit, QDialog, QComboBox, QTextEdit, 
-                            QMessageBox, QCheckBox, QFileDialog)
-from PyQt5.QtCore import QTimer, QDateTime, Qt
-from PyQt5.QtGui import QFont, QRegion, QPainterPath, QIcon
+                            QMessageBox, QCheckBox, QFileDialog, QListView)
+from PyQt5.QtCore import (QTimer, QDateTime, Qt, QObject, QThread, QThreadPool, QRunnable, pyqtSignal, pyqtSlot,
+                          QAbstractListModel, QModelIndex, QPoint, QPointF, QRect, QRectF, QSize, QEvent)
+from PyQt5.QtGui import (QFont, QPainterPath, QIcon, QColor, QPainter, QPixmap, QTextLayout, QTextOption,
+                         QFontMetrics)
 from utils_cy import (load_config, save_config, initialize_pygame, load_font, create_pixmap, 
                    DEFAULT_PROMPTS, save_user_image, get_character_images)
-from generation_cy import generate_morning_message
+from generation_cy import stream_morning_message
+from scheduler_cy import load_prefetched
+from clients_cy import close_clients, prewarm
+from fallback_cy import local_morning_message, DEFAULT_FIRST_TOKEN_DEADLINE_MS
+from telemetry_cy import get_metrics
+from archive_cy import get_archive, PAGE_SIZE
 import pygame
+import sqlite3
+import math
+import time
 import sys
 
+DEFAULT_TYPING_SPEED = 20  # characters per second
+DEFAULT_TYPING_MAX_SECONDS = 10
+MIN_FRAME_MS = 33
+REFRESH_INTERVAL_MS = 3600000  # a new message every hour
+PANEL_WIDTH = 800
+PANEL_HEIGHT = 400
+PANEL_RADIUS = 30
+PANEL_COLOR = "#2b2b2b"
+CHARACTER_SIZE = 300
+CHARACTER_OVERLAP = 80  # how far the character stands over the panel's right edge
+CHARACTER_TOP_MARGIN = 47
+
+class GenerationWorker(QThread):
+    delta = pyqtSignal(int, str)
+    restarted = pyqtSignal(int)
+    completed = pyqtSignal(int, str)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, request_id, config, use_cache=True, parent=None):
+        super().__init__(parent)
+        self.request_id = request_id
+        self.config = dict(config)
+        self.use_cache = use_cache
+        self.cancelled = False
+
+    def run(self):
+        self.message = ""
+        try:
+            for content in stream_morning_message(self.config, self.use_cache, on_restart=self.restart):
+                if self.cancelled:
+                    return
+                self.message += content
+                self.delta.emit(self.request_id, content)
+            if not self.cancelled:
+                self.completed.emit(self.request_id, self.message)
+        except Exception as e:
+            if not self.cancelled:
+                self.failed.emit(self.request_id, str(e))
+
+    def restart(self):
+        self.message = ""
+        self.restarted.emit(self.request_id)
+
+class MetricsTask(QRunnable):
+    """Adds one sample to the metrics file, which means waiting for its lock, away from the GUI thread."""
+
+    def __init__(self, metrics, section, name, value):
+        super().__init__()
+        self.metrics = metrics
+        self.section = section
+        self.name = name
+        self.value = value
+
+    def run(self):
+        try:
+            self.metrics.observe(self.section, self.name, self.value)
+        except OSError:
+            pass
+
+class GenerationService(QObject):
+    """Runs message generation on a worker thread and reports back on the GUI thread.
+
+    Only the most recent request is reported; starting a new one cancels the previous.
+    """
+    delta = pyqtSignal(str)
+    restarted = pyqtSignal()
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.workers = {}
+        self.request_id = 0
+        self.running = False
+
+    def request(self, config, use_cache=True):
+        self.cancel()
+        self.request_id += 1
+        worker = GenerationWorker(self.request_id, config, use_cache)
+        worker.delta.connect(self.on_delta)
+        worker.restarted.connect(self.on_restarted)
+        worker.completed.connect(self.on_completed)
+        worker.failed.connect(self.on_failed)
+        worker.finished.connect(self.on_worker_finished)
+        self.workers[self.request_id] = worker
+        self.running = True
+        worker.start()
+
+    def cancel(self):
+        if self.request_id in self.workers:
+            self.workers[self.request_id].cancelled = True
+        self.running = False
+
+    def shutdown(self):
+        self.cancel()
+        for worker in list(self.workers.values()):
+            worker.wait(2000)
+
+    @pyqtSlot(int, str)
+    def on_delta(self, request_id, content):
+        if request_id == self.request_id:
+            self.delta.emit(content)
+
+    @pyqtSlot(int)
+    def on_restarted(self, request_id):
+        if request_id == self.request_id:
+            self.restarted.emit()
+
+    @pyqtSlot(int, str)
+    def on_completed(self, request_id, message):
+        if request_id == self.request_id:
+            self.running = False
+            self.finished.emit(message)
+
+    @pyqtSlot(int, str)
+    def on_failed(self, request_id, error):
+        if request_id == self.request_id:
+            self.running = False
+            self.failed.emit(error)
+
+    @pyqtSlot()
+    def on_worker_finished(self):
+        self.workers.pop(self.sender().request_id, None)
+
+class FrameClock(QObject):
+    """One timer for every animation in the window.
+
+    Each subscriber is a callback that takes the frame time and returns how many
+    milliseconds until it next wants to run, or None to stop. The clock wakes
+    once for all callbacks due in the same frame, so their updates land in a
+    single repaint, and with nothing scheduled it does not wake at all.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.due = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        # A coarse timer may fire a few percent early, which would show the clock a second behind.
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+    def start(self, callback, delay_ms=0):
+        self.due[callback] = time.monotonic() + delay_ms / 1000.0
+        self.arm()
+
+    def stop(self, callback):
+        if self.due.pop(callback, None) is not None:
+            self.arm()
+
+    def running(self, callback):
+        return callback in self.due
+
+    def arm(self):
+        if not self.due:
+            self.timer.stop()
+            return
+        first = min(self.due.values())
+        # Wait for anything due within a frame of the first, so they share one wakeup;
+        # nothing runs early, and the typewriter makes up a late frame from the elapsed time.
+        wake = max(at for at in self.due.values() if at <= first + MIN_FRAME_MS / 1000.0)
+        self.timer.start(max(0, math.ceil((wake - time.monotonic()) * 1000)))
+
+    def tick(self):
+        now = time.monotonic()
+        for callback in [callback for callback, at in self.due.items() if at <= now]:
+            if callback not in self.due:
+                continue  # stopped by an earlier callback in this frame
+            delay = callback(now)
+            if delay is None:
+                self.due.pop(callback, None)
+            else:
+                self.due[callback] = now + delay / 1000.0
+        self.arm()
+
+class RevealPacer:
+    """How many characters should be showing, from the time elapsed rather than from counted ticks.
+
+    A late frame reveals every character it missed, and long messages speed up
+    so none takes more than ``max_seconds`` to type out.
+    """
+
+    def __init__(self, chars_per_second=DEFAULT_TYPING_SPEED, max_seconds=DEFAULT_TYPING_MAX_SECONDS):
+        self.chars_per_second = max(1.0, float(chars_per_second))
+        self.max_seconds = max_seconds
+        self.reset()
+
+    def reset(self):
+        self.position = 0.0
+        self.last = None
+
+    def resume(self, now):
+        """Start counting from ``now``; time spent waiting for more text is not made up for."""
+        self.last = now
+
+    def rate(self, available):
+        if self.max_seconds > 0:
+            return max(self.chars_per_second, available / self.max_seconds)
+        return self.chars_per_second
+
+    def advance(self, now, available):
+        """Return how many of the ``available`` characters should be showing at ``now``."""
+        if self.last is not None:
+            self.position = min(available, self.position + (now - self.last) * self.rate(available))
+        self.last = now
+        return int(self.position)
+
+    def interval_ms(self):
+        # At most one wakeup per character at the base speed; faster typing reveals several per frame.
+        return max(MIN_FRAME_MS, int(1000 / self.chars_per_second))
+
+class TypewriterLabel(QWidget):
+    """Word-wrapped, centred text revealed one character at a time.
+
+    Streamed text is only stored as it arrives. It is laid out with
+    QTextLayout when the reveal reaches it, at most once per frame, not on
+    every delta or revealed character. Each character is uncovered by widening a clip
+    over its line, so it appears where it will end up, and only the new
+    glyph's rectangle is repainted.
+
+    The widget only takes part in the layout. The window draws it with
+    ``draw`` in its own paintEvent, so the text has no surface of its own.
+    """
+
+    def __init__(self, text="", parent=None):
+        super().__init__(parent)
+        self.text = ""
+        self.revealed = 0
+        self.color = QColor("#ffffff")
+        self.text_layout = QTextLayout()
+        self.text_height = 0.0
+        self.laid_out = 0  # characters of the text in text_layout
+        self.positions = None  # UTF-16 offset of each character, only when the text has any outside the BMP
+        self.setText(text)
+
+    def setColor(self, color):
+        self.color = QColor(color)
+        self.dirty()
+
+    def setText(self, text):
+        """Show ``text`` at once, like QLabel.setText."""
+        self.startTyping(text)
+        self.setRevealed(len(self.text))
+
+    def startTyping(self, text=""):
+        """Lay out ``text`` with nothing shown yet."""
+        self.text = ""
+        self.positions = None
+        self.revealed = 0
+        self._extend(text)
+        self.relayout()
+        self.dirty()
+
+    def appendText(self, text):
+        """Add streamed ``text``; it is laid out once the reveal gets to it."""
+        self._extend(text)
+
+    def _extend(self, text):
+        if self.positions is None and any(ord(char) > 0xFFFF for char in text):
+            self.positions = list(range(len(self.text) + 1))
+        if self.positions is not None:
+            offset = self.positions[len(self.positions) - 1]
+            for char in text:
+                offset += 2 if ord(char) > 0xFFFF else 1
+                self.positions.append(offset)
+        self.text += text
+
+    def setRevealed(self, count):
+        """Show the first ``count`` characters, repainting only the ones that changed."""
+        count = max(0, min(count, len(self.text)))
+        if count == self.revealed:
+            return
+        if count > self.laid_out:
+            before = self._revealed_geometry()
+            self.relayout()
+            if before is not None and self._revealed_geometry() != before:
+                # A word that no longer fits wrapped to the next line, or the line was centred again.
+                self.dirty()
+        previous, self.revealed = self.revealed, count
+        first, last = sorted((self._position(previous), self._position(count)))
+        top = self._top()
+        line = self.text_layout.lineForTextPosition(first)
+        while line.isValid() and line.textStart() < last:
+            left = line.cursorToX(max(first, line.textStart()))[0]
+            right = line.cursorToX(min(last, line.textStart() + line.textLength()))[0]
+            self.dirty(QRectF(min(left, right), top + line.y(), abs(right - left) + 1, line.height()).toAlignedRect())
+            if line.lineNumber() + 1 >= self.text_layout.lineCount():
+                break
+            line = self.text_layout.lineAt(line.lineNumber() + 1)
+
+    def dirty(self, rect=None):
+        """Have the window repaint ``rect`` of the label, or all of it."""
+        if rect is None:
+            rect = self.rect()
+        window = self.window()
+        window.update(rect.translated(self.mapTo(window, QPoint(0, 0))))
+
+    def _revealed_geometry(self):
+        """Where the last line of the shown text is, or None with nothing shown."""
+        if self.revealed == 0:
+            return None
+        end = self._position(self.revealed)
+        line = self.text_layout.lineForTextPosition(self._position(self.revealed - 1))
+        return (line.lineNumber(), line.textStart(), line.cursorToX(line.textStart())[0],
+                line.cursorToX(end)[0], self._top() + line.y())
+
+    def _position(self, index):
+        # Qt counts UTF-16 code units; emoji take two.
+        if self.positions is None:
+            return index
+        return self.positions[index]
+
+    def _top(self):
+        return max(0.0, (self.height() - self.text_height) / 2)
+
+    def relayout(self):
+        option = QTextOption(Qt.AlignHCenter)
+        option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        self.text_layout = QTextLayout(self.text, self.font())
+        self.text_layout.setTextOption(option)
+        self.text_layout.setCacheEnabled(True)
+        self.text_height = self._layout_lines(self.text_layout, self.width())
+        self.laid_out = len(self.text)
+        self.updateGeometry()
+
+    def _layout_lines(self, layout, width):
+        height = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(width)
+            line.setPosition(QPointF(0, height))
+            height += line.height()
+        layout.endLayout()
+        return height
+
+    def hasHeightForWidth(self):
+        return True
+
+    def heightForWidth(self, width):
+        layout = QTextLayout(self.text, self.font())
+        option = QTextOption(Qt.AlignHCenter)
+        option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        layout.setTextOption(option)
+        return int(self._layout_lines(layout, width)) + 1
+
+    def sizeHint(self):
+        metrics = QFontMetrics(self.font())
+        return QSize(metrics.averageCharWidth() * 40, metrics.lineSpacing() * 3)
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.FontChange:
+            self.relayout()
+        super().changeEvent(event)
+
+    def resizeEvent(self, event):
+        self.relayout()
+        super().resizeEvent(event)
+
+    def draw(self, painter, clip):
+        """Paint the revealed text with ``painter`` set to the label's coordinates, within ``clip``."""
+        if self.revealed == 0:
+            return
+        painter.setPen(self.color)
+        clip = QRectF(clip)
+        origin = QPointF(0, self._top())
+        end = self._position(self.revealed)
+        for index in range(self.text_layout.lineCount()):
+            line = self.text_layout.lineAt(index)
+            if line.textStart() >= end:
+                break
+            rect = line.rect().translated(origin)
+            if not rect.intersects(clip):
+                continue
+            if line.textStart() + line.textLength() <= end:
+                line.draw(painter, origin)
+            else:
+                painter.save()
+                painter.setClipRect(QRectF(rect.left(), rect.top(), line.cursorToX(end)[0] - rect.left(), rect.height()),
+                                    Qt.IntersectClip)
+                line.draw(painter, origin)
+                painter.restore()
+
 class SettingsDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -132,11 +527,97 @@ class SettingsDialog(QDialog):
         QMessageBox.information(self, "Settings", "Settings saved successfully!")
         self.accept()
 
+class ArchiveModel(QAbstractListModel):
+    """Past messages, newest first, read from the archive one page at a time as the list scrolls."""
+
+    def __init__(self, archive, query=None, parent=None):
+        super().__init__(parent)
+        self.archive = archive
+        self.query = query
+        self.rows = []
+        self.exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        return f"{row['created'].replace('T', ' ')}  {row['profile']}  {row['model'] or ''}\n{row['message']}"
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        before = self.rows[-1]["id"] if self.rows else None
+        try:
+            page = self.archive.page(before, PAGE_SIZE, self.query)
+        except sqlite3.Error as e:
+            print(f"Error: {e}")
+            page = []
+        if len(page) < PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+class PastMorningsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.archive = get_archive()
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Past Mornings")
+        self.setGeometry(300, 300, 500, 600)
+        layout = QVBoxLayout(self)
+
+        self.search_input = QLineEdit(self)
+        self.search_input.setPlaceholderText("Search messages")
+        layout.addWidget(self.search_input)
+
+        # Search once typing pauses rather than on every key.
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.search)
+        self.search_input.textChanged.connect(lambda: self.search_timer.start(250))
+
+        self.count_label = QLabel("", self)
+        layout.addWidget(self.count_label)
+
+        self.list_view = QListView(self)
+        self.list_view.setWordWrap(True)
+        self.list_view.setAlternatingRowColors(True)
+        layout.addWidget(self.list_view)
+
+        self.search()
+
+    def search(self):
+        query = self.search_input.text().strip() or None
+        self.model = ArchiveModel(self.archive, query, self)
+        self.list_view.setModel(self.model)
+        try:
+            count = self.archive.count(query)
+        except sqlite3.Error as e:
+            print(f"Error: {e}")
+            count = 0
+        self.count_label.setText(f"{count} messages" if query else f"{count} mornings")
+
 class ModernWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.config = load_config()
+        # A message prefetched overnight is a file read; only warm up the connection when one is needed.
+        self.prefetched = load_prefetched(self.config)
+        if not self.prefetched:
+            prewarm(self.config)
         initialize_pygame()
+        self.generation = GenerationService(self)
+        self.frame_clock = FrameClock(self)
 
         if not self.config.get("token") or not self.config.get("name"):
             self.show_setup_ui()
@@ -194,6 +675,9 @@ class ModernWindow(QWidget):
 
         self.lang_combo.currentTextChanged.connect(self.update_prompt)
 
+        self.generation.finished.connect(self.on_setup_validated)
+        self.generation.failed.connect(self.on_setup_failed)
+
     def update_prompt(self, language):
         if not self.custom_prompt_check.isChecked():
             self.prompt_edit.setPlainText(DEFAULT_PROMPTS[language])
@@ -224,41 +708,46 @@ class ModernWindow(QWidget):
             else:
                 self.config["prompt"] = DEFAULT_PROMPTS[language]
             save_config(self.config)
-            
-            try:
-                generate_morning_message(self.config)
-                QMessageBox.information(self, "Success", "Configuration saved successfully!")
-                sys.exit()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", str(e))
-                return
+
+            self.save_button.setEnabled(False)
+            self.generation.request(self.config, use_cache=False)
                 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save configuration: {str(e)}")
 
+    def on_setup_validated(self, message):
+        QMessageBox.information(self, "Success", "Configuration saved successfully!")
+        # Through the event loop, so aboutToQuit still stops the workers and closes the connections.
+        QApplication.quit()
+
+    def on_setup_failed(self, error):
+        self.save_button.setEnabled(True)
+        QMessageBox.critical(self, "Error", error)
+
     def init_ui(self):
         self.setWindowTitle("GoodMorning")
         self.setWindowIcon(QIcon("fumo.ico"))
-        self.setGeometry(0, 0, 800, 400)
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
 
+        # The panel is centred on the screen; the character stands over its right edge in the same window.
+        width = PANEL_WIDTH - CHARACTER_OVERLAP + CHARACTER_SIZE
         screen = QApplication.primaryScreen().geometry()
-        x = (screen.width() - self.width()) // 2
-        y = (screen.height() - self.height()) // 2
-        self.setGeometry(x, y, 800, 400)
+        x = (screen.width() - PANEL_WIDTH) // 2
+        y = (screen.height() - PANEL_HEIGHT) // 2
+        self.setGeometry(x, y, width, PANEL_HEIGHT)
+
+        self.character = CharacterSprite(self, QRect(PANEL_WIDTH - CHARACTER_OVERLAP,
+                                                     (PANEL_HEIGHT - CHARACTER_SIZE) // 2,
+                                                     CHARACTER_SIZE, CHARACTER_SIZE))
 
-        path = QPainterPath()
-        path.addRoundedRect(0, 0, 800, 400, 30, 30)
-        region = QRegion(path.toFillPolygon().toPolygon())
-        self.setMask(region)
+        # Translucent outside the panel and the character, so no mask is needed for the rounded corners.
+        self.panel_size = QSize(PANEL_WIDTH, PANEL_HEIGHT)
+        self.panel_cache = None
+        self.panel_key = None
 
         container = QWidget(self)
-        container.setGeometry(0, 0, 800, 400)
-        container.setStyleSheet(
-            "background-color: #2b2b2b; "
-            "border-radius: 30px; "
-        )
+        container.setGeometry(0, 0, PANEL_WIDTH, PANEL_HEIGHT)
 
         font = load_font(16)
 
@@ -281,11 +770,9 @@ class ModernWindow(QWidget):
         self.date_time_layout.addWidget(self.date_time_label)
         self.date_time_layout.setAlignment(Qt.AlignCenter)
 
-        self.label = QLabel("", self)
+        self.label = TypewriterLabel("", self)
         self.label.setFont(font)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.label.setWordWrap(True)
-        self.label.setStyleSheet("color: #ffffff;")
+        self.label.setColor("#ffffff")
 
         self.close_button = QPushButton("txh", self)
         self.close_button.setFont(font)
@@ -305,48 +792,142 @@ class ModernWindow(QWidget):
         )
         self.settings_button.clicked.connect(self.show_settings)
 
+        self.history_button = QPushButton("Past Mornings", self)
+        self.history_button.setFont(font)
+        self.history_button.setStyleSheet(
+            "background-color: #2b2b2b; "
+            "color: #00ff00; "
+            "border: none; "
+        )
+        self.history_button.clicked.connect(self.show_history)
+
         layout = QVBoxLayout(container)
         layout.addWidget(self.date_time_container, alignment=Qt.AlignCenter)
-        layout.addWidget(self.label, alignment=Qt.AlignCenter)
+        # The label takes the space left over, so the clock and buttons stay put as the message grows.
+        layout.addWidget(self.label, 1)
         layout.addWidget(self.close_button, alignment=Qt.AlignCenter)
         layout.addWidget(self.settings_button, alignment=Qt.AlignCenter)
+        layout.addWidget(self.history_button, alignment=Qt.AlignCenter)
         layout.setContentsMargins(20, 20, 20, 20)
 
-        self.text = generate_morning_message(self.config)
-        self.current_index = 0
+        self.pacer = RevealPacer(self.config.get("typing_speed", DEFAULT_TYPING_SPEED),
+                                 self.config.get("typing_max_seconds", DEFAULT_TYPING_MAX_SECONDS))
+        self.tick_sound = pygame.mixer.Sound("data/audio/3.mp3")
+        self.tick_sound.set_volume(0.2)
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_text)
-        self.timer.start(50)
+        self.deadline_timer = QTimer(self)
+        self.deadline_timer.setSingleShot(True)
+        self.deadline_timer.timeout.connect(self.show_fallback)
+        self.showing_fallback = False
+        self.requested_at = None
 
-        self.date_time_timer = QTimer(self)
-        self.date_time_timer.timeout.connect(self.update_date_time)
-        self.date_time_timer.start(1000)
-        self.update_date_time()
+        self.generation.delta.connect(self.on_message_delta)
+        self.generation.restarted.connect(self.on_message_restarted)
+        self.generation.finished.connect(self.on_message_finished)
+        self.generation.failed.connect(self.on_message_failed)
+
+        if self.prefetched:
+            self.show_message(self.prefetched)
+        else:
+            self.refresh_message()
 
-        self.character_window = CharacterWindow(self)
+        self.frame_clock.start(self.update_refresh, REFRESH_INTERVAL_MS)
+        self.time_icon_path = None
+        self.frame_clock.start(self.update_date_time)
 
     def show_settings(self):
         dialog = SettingsDialog(self)
         dialog.exec_()
 
-    def update_text(self):
-        if self.current_index < len(self.text):
-            self.label.setText(self.label.text() + self.text[self.current_index])
-            self.current_index += 1
+    def show_history(self):
+        dialog = PastMorningsDialog(self)
+        dialog.exec_()
 
-            sound = pygame.mixer.Sound(r"data\audio\3.mp3")
-            sound.set_volume(0.2)
-            sound.play()
+    def refresh_message(self):
+        self.text = ""
+        self.current_index = 0
+        self.showing_fallback = False
+        self.label.setText("...")
+        self.requested_at = time.perf_counter()
+        self.generation.request(self.config)
 
-            self.character_window.update_character()
-        else:
-            self.timer.stop()
+        deadline = self.config.get("first_token_deadline_ms", DEFAULT_FIRST_TOKEN_DEADLINE_MS)
+        if deadline > 0:
+            self.deadline_timer.start(deadline)
+
+    def show_message(self, text):
+        self.text = text
+        self.current_index = 0
+        self.label.startTyping(text)
+        self.pacer.reset()
+        self.start_typing()
+
+    def start_typing(self):
+        if not self.frame_clock.running(self.update_text):
+            self.pacer.resume(time.monotonic())
+            self.frame_clock.start(self.update_text, self.pacer.interval_ms())
+
+    def show_fallback(self):
+        if self.text:
+            return
+        self.showing_fallback = True
+        self.show_message(local_morning_message(self.config))
+
+    def on_message_delta(self, content):
+        self.deadline_timer.stop()
+        if self.showing_fallback:
+            return
+        if not self.text:
+            self.label.startTyping("")
+            self.pacer.reset()
+        self.text += content
+        self.label.appendText(content)
+        self.start_typing()
+
+    def on_message_restarted(self):
+        # The message was too close to a recent one and is being written again.
+        if not self.showing_fallback:
+            self.show_message("")
+
+    def on_message_finished(self, message):
+        if self.showing_fallback:
+            self.showing_fallback = False
+            self.show_message(message)
+
+    def on_message_failed(self, error):
+        self.deadline_timer.stop()
+        print(f"Error: {error}")
+        self.show_fallback()
 
-            pygame.mixer.stop()
+    def update_text(self, now):
+        revealed = self.pacer.advance(now, len(self.text))
+        if revealed > self.current_index:
+            self.current_index = revealed
+            self.label.setRevealed(self.current_index)
+            if self.requested_at is not None:
+                self.record_first_character()
 
+            self.tick_sound.play()
+            self.character.update_character()
+        if self.current_index >= len(self.text):
+            if not self.generation.running:
+                pygame.mixer.stop()
+            # More text restarts the typewriter from on_message_delta.
+            return None
+        return self.pacer.interval_ms()
 
-    def update_date_time(self):
+    def update_refresh(self, now):
+        self.refresh_message()
+        return REFRESH_INTERVAL_MS
+
+    def record_first_character(self):
+        elapsed = time.perf_counter() - self.requested_at
+        self.requested_at = None
+        metrics = get_metrics(self.config)
+        if metrics is not None:
+            QThreadPool.globalInstance().start(MetricsTask(metrics, "window", "first_character_ms", elapsed * 1000))
+
+    def update_date_time(self, now=None):
         current_time = QDateTime.currentDateTime()
         time_str = current_time.toString("dddd, MMMM d yyyy, hh:mm:ss AP")
         self.date_time_label.setText(time_str)
@@ -359,47 +940,97 @@ class ModernWindow(QWidget):
         else:
             icon_path = "data/image/moon.png"
 
-        pixmap = create_pixmap(icon_path, 20, 20)
-        self.time_icon.setPixmap(pixmap)
+        if icon_path != self.time_icon_path:
+            self.time_icon_path = icon_path
+            self.time_icon.setPixmap(create_pixmap(icon_path, 20, 20))
+        # Wake on the next second boundary, so the seconds never lag.
+        return 1000 - current_time.time().msec()
 
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        if hasattr(self, 'character_window'):
-            self.character_window.setGeometry(self.geometry().x() + self.width() - 80, self.geometry().y() + int(self.height() / 2 - 150), 300, 300)
+    def showEvent(self, event):
+        super().showEvent(event)
+        if hasattr(self, 'date_time_label'):
+            self.frame_clock.start(self.update_date_time)
 
-class CharacterWindow(QWidget):
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.parent = parent
-        self.setWindowFlags(Qt.FramelessWindowHint | Qt.Tool)
-        self.setAttribute(Qt.WA_TranslucentBackground)
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        # Nobody sees the clock while the window is minimised or hidden.
+        self.frame_clock.stop(self.update_date_time)
 
-        self.character_label = QLabel(self)
-        self.character_label.setFixedSize(300, 300)
-        
+    def closeEvent(self, event):
+        self.generation.cancel()
+        super().closeEvent(event)
+
+    def paintEvent(self, event):
+        if not hasattr(self, 'label'):
+            return
+        # Panel, text and character in one pass, only where something changed.
+        # The region, not its bounding rect: a new glyph and a mouth flap are far apart.
+        painter = QPainter(self)
+        clip = event.region()
+        painter.setClipRegion(clip)
+        painter.drawPixmap(0, 0, self.panel_pixmap())
+
+        offset = self.label.mapTo(self, QPoint(0, 0))
+        painter.save()
+        painter.translate(offset)
+        self.label.draw(painter, clip.translated(-offset).boundingRect())
+        painter.restore()
+
+        self.character.draw(painter, clip)
+
+    def panel_pixmap(self):
+        """The antialiased rounded panel, drawn again only when its size or the screen's pixel ratio changes."""
+        ratio = self.devicePixelRatioF()
+        key = (self.panel_size.width(), self.panel_size.height(), ratio)
+        if key != self.panel_key:
+            pixmap = QPixmap(self.panel_size * ratio)
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.transparent)
+            path = QPainterPath()
+            path.addRoundedRect(QRectF(0, 0, self.panel_size.width(), self.panel_size.height()), PANEL_RADIUS, PANEL_RADIUS)
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.fillPath(path, QColor(PANEL_COLOR))
+            painter.end()
+            self.panel_cache, self.panel_key = pixmap, key
+        return self.panel_cache
+
+class CharacterSprite:
+    """The character, painted by the window over its panel.
+
+    Both mouth images are scaled once, and a flap repaints only the sprite's
+    rectangle of the window.
+    """
+
+    def __init__(self, window, rect):
+        self.window = window
+        self.rect = rect
         images = get_character_images()
-        self.closed_image = create_pixmap(images["closed"], 300, 300)
-        self.open_image = create_pixmap(images["open"], 300, 300)
-        self.character_label.setPixmap(self.closed_image)
-
-        layout = QVBoxLayout()
-        layout.addWidget(self.character_label)
-        layout.setContentsMargins(0, 47, 0, 0)
-        self.setLayout(layout)
-         
-        self.setGeometry(self.parent.geometry().x() + self.parent.width() - 300, 
-                        self.parent.geometry().y() + int(self.parent.height() / 2 - 150), 
-                        300, 300)
-        self.show()
+        self.closed_image = create_pixmap(images["closed"], CHARACTER_SIZE, CHARACTER_SIZE)
+        self.open_image = create_pixmap(images["open"], CHARACTER_SIZE, CHARACTER_SIZE)
+        self.mouth_open = False
 
     def update_character(self):
-        if self.parent.current_index % 2 == 0:
-            self.character_label.setPixmap(self.open_image)
-        else:
-            self.character_label.setPixmap(self.closed_image)
+        # Flap once per frame; a frame can reveal several characters.
+        self.mouth_open = not self.mouth_open
+        self.window.update(self.rect)
+
+    def draw(self, painter, clip):
+        if not clip.intersects(self.rect):
+            return
+        pixmap = self.open_image if self.mouth_open else self.closed_image
+        # Below the top margin and cut off at the bottom, as the character has always been shown.
+        top = self.rect.top() + CHARACTER_TOP_MARGIN + (CHARACTER_SIZE - pixmap.height()) // 2
+        painter.save()
+        painter.setClipRect(self.rect, Qt.IntersectClip)
+        painter.drawPixmap(self.rect.left(), top, pixmap)
+        painter.restore()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = ModernWindow()
+    # Stop the workers before closing the connections they stream over.
+    app.aboutToQuit.connect(window.generation.shutdown)
+    app.aboutToQuit.connect(close_clients)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
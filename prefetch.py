@@ -0,0 +1,17 @@
+import argparse
+from config_cy import load_config
+from generation_cy import generate_batch
+from scheduler_cy import run_scheduler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch the next morning message so the window opens without waiting on the network.")
+    parser.add_argument("--once", action="store_true", help="prefetch right away and exit instead of waiting for prefetch_time")
+    parser.add_argument("--week", action="store_true", help="fill the message cache for the next 7 days of morning, afternoon and evening and exit")
+    args = parser.parse_args()
+
+    if args.week:
+        results = generate_batch(load_config())
+        for result in results:
+            print(f"{result['time']:%A %H:%M}: {result['error'] or 'ok'}")
+    else:
+        run_scheduler(once=args.once)
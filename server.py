@@ -0,0 +1,17 @@
+import argparse
+from config_cy import CONFIG_FILE, load_config
+from service_cy import run_service, DEFAULT_SERVICE_WORKERS, DEFAULT_SERVICE_QUEUE
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve morning messages over HTTP for a whole team.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="profile with the API token and model to use (default: config.json)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_SERVICE_WORKERS, help="messages generated at the same time")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_SERVICE_QUEUE, help="messages waiting for a worker before requests are turned away")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if not config.get("token"):
+        parser.error(f"{args.config} has no API token; run the app once or add \"token\" to it.")
+    run_service(config, args.host, args.port, args.workers, args.max_queue)
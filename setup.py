@@ -3,6 +3,10 @@ from Cython.Build import cythonize
 import numpy
 
 extensions = [
+    Extension(
+        "config_cy",
+        ["cython_modules/config.pyx"],
+    ),
     Extension(
         "utils_cy",
         ["cython_modules/utils.pyx"],
@@ -12,6 +16,54 @@ extensions = [
         "generation_cy",
         ["cython_modules/generation.pyx"],
     ),
+    Extension(
+        "transport_cy",
+        ["cython_modules/transport.pyx"],
+    ),
+    Extension(
+        "clients_cy",
+        ["cython_modules/clients.pyx"],
+    ),
+    Extension(
+        "ratelimit_cy",
+        ["cython_modules/ratelimit.pyx"],
+    ),
+    Extension(
+        "resilience_cy",
+        ["cython_modules/resilience.pyx"],
+    ),
+    Extension(
+        "telemetry_cy",
+        ["cython_modules/telemetry.pyx"],
+    ),
+    Extension(
+        "archive_cy",
+        ["cython_modules/archive.pyx"],
+    ),
+    Extension(
+        "history_cy",
+        ["cython_modules/history.pyx"],
+    ),
+    Extension(
+        "cache_cy",
+        ["cython_modules/cache.pyx"],
+    ),
+    Extension(
+        "fallback_cy",
+        ["cython_modules/fallback.pyx"],
+    ),
+    Extension(
+        "scheduler_cy",
+        ["cython_modules/scheduler.pyx"],
+    ),
+    Extension(
+        "service_cy",
+        ["cython_modules/service.pyx"],
+    ),
+    Extension(
+        "bulk_cy",
+        ["cython_modules/bulk.pyx"],
+    ),
 ]
 
 setup(